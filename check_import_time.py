@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Measures the cold-start import time of the launcher and the command line processors with `python -X importtime`,
+# failing when an entry point goes over its budget or imports a library that should only be loaded once a tool runs.
+# Usage: python check_import_time.py [--runs N] [--scale FACTOR]
+
+import argparse
+import os
+import subprocess
+import sys
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+
+AUDIO_LIBRARIES = ("numpy", "soundfile", "resampy", "numba")
+
+# Entry point -> (arguments of the interpreter, budget in milliseconds, libraries it must not import).
+# Budgets are measured on a modest machine with room to spare. The libraries are loaded when an exporter is opened
+# or a conversion runs, so neither starting the launcher nor asking a command line processor for --help loads them.
+ENTRY_POINTS = {
+    "launcher": (["-c", "import launcher"], 450, AUDIO_LIBRARIES + ("apps.groups_exporter_gui", "apps.previews_exporter_gui")),
+    "build_previews_json": (["-c", "import processors.previews.build_previews_json"], 250, AUDIO_LIBRARIES),
+    "build_groups_json": (["-c", "import processors.groups.build_groups_json"], 250, AUDIO_LIBRARIES),
+    "process_previews_json": (["-c", "import processors.previews.process_previews_json"], 400, AUDIO_LIBRARIES),
+    "process_groups_json": (["-c", "import processors.groups.process_groups_json"], 450, AUDIO_LIBRARIES),
+    "process_previews_json --help": (["processors/previews/process_previews_json.py", "--help"], 400, AUDIO_LIBRARIES),
+    "process_groups_json --help": (["processors/groups/process_groups_json.py", "--help"], 450, AUDIO_LIBRARIES),
+}
+
+
+def run_importtime(arguments: list[str]) -> dict[str, tuple[int, float]]:
+    """Run the interpreter with -X importtime, returning the nesting level and cumulative time in ms of every import."""
+    result = subprocess.run([sys.executable, "-X", "importtime", *arguments], cwd=SRC_PATH, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": SRC_PATH})
+    if result.returncode != 0:
+        raise RuntimeError(f"Running {' '.join(arguments)} failed:\n{result.stderr}")
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports[name.strip()] = ((len(name) - len(name.lstrip()) - 1) // 2, int(cumulative) / 1000)
+    return imports
+
+
+def measure(arguments: list[str], startup: set[str]) -> tuple[float, dict[str, float]]:
+    """Return the time spent importing by an entry point, leaving out the startup of the interpreter, and the cumulative time of every import."""
+    imports = run_importtime(arguments)
+    total = sum(t for name, (level, t) in imports.items() if level == 0 and name not in startup)
+    return total, {name: t for name, (_, t) in imports.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the NITools entry points against their budgets.")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per entry point, the fastest one is kept")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the budgets, e.g. for slow CI machines")
+    args = parser.parse_args()
+
+    startup = set(run_importtime(["-c", "pass"]))  # Imported by site before any entry point
+    failed = False
+    for entry_point, (arguments, budget, forbidden) in ENTRY_POINTS.items():
+        # The first runs also pay for reading files from disk and writing .pyc files, the fastest one is the most stable
+        total, imports = min((measure(arguments, startup) for _ in range(args.runs)), key=lambda measured: measured[0])
+        budget *= args.scale
+        status = "OK" if total <= budget else "OVER BUDGET"
+        print(f"{entry_point}: {total:.0f} ms (budget {budget:.0f} ms) {status}")
+        if total > budget:
+            failed = True
+            slowest = sorted(((t, name) for name, t in imports.items() if name not in startup), reverse=True)[:5]
+            for t, name in slowest:
+                print(f"    {name}: {t:.0f} ms")
+        loaded = [name for name in forbidden if name in imports]
+        if loaded:
+            failed = True
+            print(f"    imports {', '.join(loaded)}, which should only be loaded when needed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
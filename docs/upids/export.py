@@ -1,5 +1,3 @@
-import json
-
 # Sort the UPIDs in upids.txt by the part after the first space
 # UPIDs are in the format: <UPID> <Description>
 # Initial dump retrieved with Native Access Product Report from https://bobdule999.wixsite.com/librarytools/extra
@@ -15,8 +13,9 @@ lines = [line.rstrip("\n") for line in lines]
 sorted_lines = sorted(lines, key=lambda x: x.split(' ', 1)[1])
 
 # Build a dictionary {UPID: Description}
-upid_dict = {line.split(' ', 1)[0]: line.split(' ', 1)[1] for line in sorted_lines}
+upid_dict = {line.split(' ', 1)[0]: line.split(' ', 1)[1].strip() for line in sorted_lines}
 
-# Export to JSON
-with open("resources/upids.json", "w", encoding="utf-8") as f:
-    json.dump(upid_dict, f, ensure_ascii=False, indent=4)
+# Export to a tab separated table, read by src/processors/previews/upid_index.py when first needed
+with open("resources/upids.tsv", "w", encoding="utf-8", newline="\n") as f:
+    for upid, description in upid_dict.items():
+        f.write(f"{upid}\t{description}\n")
@@ -8,6 +8,7 @@ from PyQt6.QtWidgets import QMessageBox
 from components.ansi_text_edit import AnsiTextEdit
 from components.bottom_banner import BottomBanner
 from components.matrix_editor import MatrixEditor
+from components.no_wheel_spinbox import NoWheelSpinBox
 from components.pad_filter_editor import PadFilterEditor
 from components.resizable_log_splitter import ResizableLogSplitter
 from dialogs.error_dialog import ErrorDialog
@@ -17,13 +18,15 @@ from processors.groups.build_groups_json import GroupsJsonBuilder
 from processors.groups.process_groups_json import GroupsProcessor
 from utils import config_utils
 from utils.bundle_utils import get_bundled_path
+from utils.enums import AudioFormat
+from utils.process_utils import WorkerPool
 from utils.style_utils import apply_style
-from utils.worker_utils import WorkerThread
+from utils.worker_utils import ProgressEstimator, WorkerThread
 
 
 class GroupsExporterGUI(QtWidgets.QDialog):
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, worker_pool: WorkerPool | None = None):
         super().__init__(parent)
         self.setWindowIcon(QtGui.QIcon(get_bundled_path("resources/icons/groups.png")))
         self.setWindowTitle('NITools - Groups Exporter')
@@ -33,7 +36,10 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         self.config: Config = config_utils.load_config()
         apply_style(self.config.style)  # Apply style for standalone execution
         self.worker = None
+        self.worker_pool = worker_pool  # Shared by the launcher, or started here when run on its own
+        self.owns_worker_pool = worker_pool is None
         self.progress_dialog = None
+        self.progress_estimator = None
         self.cancelled = False
         self.has_output = False
         self.last_built_json_path = None
@@ -148,6 +154,8 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         self.trim_silence.setToolTip('If checked, leading and trailing silence will be removed from samples.')
         self.normalize = QtWidgets.QCheckBox('Normalize')
         self.normalize.setToolTip('If checked, audio samples will be normalized to a standard loudness level.')
+        self.store_features = QtWidgets.QCheckBox('Store audio features')
+        self.store_features.setToolTip('If checked, duration, peak, RMS, leading silence, channels and sample rate of every source are saved to features.db in the output folder, ready to be queried without decoding the library again.')
         self.include_preview = QtWidgets.QCheckBox('Include preview samples')
         self.include_preview.setToolTip('If checked, a short preview sample will be generated for each group.')
         self.sample_rate = QtWidgets.QLineEdit()
@@ -156,14 +164,26 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         self.bit_depth = QtWidgets.QLineEdit()
         self.bit_depth.setPlaceholderText('Bit depth (e.g. 16)')
         self.bit_depth.setToolTip('Set the bit depth for exported audio (e.g., 16, 24). Leave blank for original.')
+        self.output_format = QtWidgets.QComboBox()
+        for audio_format in (AudioFormat.WAV, AudioFormat.FLAC):
+            self.output_format.addItem(audio_format.value, audio_format)
+        self.output_format.setToolTip('Select the format of the exported audio. FLAC is lossless and roughly halves the size of the files.')
+        self.compression_level = NoWheelSpinBox()
+        self.compression_level.setRange(0, 8)
+        self.compression_level.setToolTip('Set the FLAC compression level, from 0 (fastest) to 8 (smallest files).')
         options_layout.addWidget(self.skip_existing)
         options_layout.addWidget(self.trim_silence)
         options_layout.addWidget(self.normalize)
+        options_layout.addWidget(self.store_features)
         options_layout.addWidget(self.include_preview)
         options_layout.addWidget(QtWidgets.QLabel('Sample rate:'))
         options_layout.addWidget(self.sample_rate)
         options_layout.addWidget(QtWidgets.QLabel('Bit depth:'))
         options_layout.addWidget(self.bit_depth)
+        options_layout.addWidget(QtWidgets.QLabel('Format:'))
+        options_layout.addWidget(self.output_format)
+        options_layout.addWidget(QtWidgets.QLabel('FLAC compression level:'))
+        options_layout.addWidget(self.compression_level)
         options_group.setLayout(options_layout)
         export_form_layout.addRow(options_group)
 
@@ -241,7 +261,7 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         self.tabs.addTab(self.tab_export, 'Export Groups')
 
         # --- Log/output ---
-        self.log_output = AnsiTextEdit()
+        self.log_output = AnsiTextEdit(self.config.max_log_lines)
         self.log_output.setReadOnly(True)
 
         # Create a splitter to make the log_output resizable
@@ -260,20 +280,35 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         # Connect enable checkboxes to update UI state
         self.enable_matrix.stateChanged.connect(self._update_matrix_editor_state)
         self.filter_pads.stateChanged.connect(self._update_pad_filter_editor_state)
+        self.output_format.currentIndexChanged.connect(self._update_compression_level_state)
         self.on_json_path_changed()  # Call once to set initial state based on json_path
         self.toggle_terminal_visibility(self.config.groups_exporter.show_terminal)
+        if self.config.run_in_process:
+            self.get_worker_pool().start()  # Warms up while the options are set, so the first run starts right away
 
     def closeEvent(self, event):
         # Save current window size to config
         self.config.groups_exporter.width = self.width()
         self.config.groups_exporter.height = self.height()
         config_utils.save_config(self.config)
+        if self.owns_worker_pool and self.worker_pool:
+            self.worker_pool.shutdown()
         super().closeEvent(event)
 
+    def done(self, result):
+        # Closing with Esc rejects the dialog without a closeEvent, so write the changes still waiting to be saved
+        config_utils.flush_config()
+        super().done(result)
+
+    def get_worker_pool(self) -> WorkerPool:
+        if self.worker_pool is None:
+            self.worker_pool = WorkerPool()
+        return self.worker_pool
+
     def toggle_terminal_visibility(self, state):
         self.log_output.setVisible(state)
         self.config.groups_exporter.show_terminal = state
-        config_utils.save_config(self.config)
+        config_utils.schedule_save_config(self.config)
 
     def show_loading(self, message):
         self.cancelled = False
@@ -282,6 +317,10 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         self.progress_dialog.setWindowTitle('Please wait')
         self.progress_dialog.setMinimumDuration(0)
         self.progress_dialog.canceled.connect(self.cancel_worker)
+        # Stays open at 100%, it is closed when the worker finishes
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_estimator = ProgressEstimator()
         self.progress_dialog.show()
 
     def hide_loading(self):
@@ -299,6 +338,13 @@ class GroupsExporterGUI(QtWidgets.QDialog):
             self.run_process_btn.setEnabled(True)
             self.hide_loading()
 
+    def on_worker_progress(self, stage, done, total, bytes_done):
+        if not self.progress_dialog:
+            return
+        self.progress_dialog.setMaximum(total)  # 0 keeps the busy indicator when the total is unknown
+        self.progress_dialog.setValue(min(done, total))
+        self.progress_dialog.setLabelText(self.progress_estimator.describe(stage, done, total, bytes_done))
+
     def on_worker_output(self, text):
         self.log_output.append(text)
         self.has_output = True
@@ -314,8 +360,11 @@ class GroupsExporterGUI(QtWidgets.QDialog):
             (self.proc_output_folder, 'proc_output_folder'),
             (self.trim_silence, 'trim_silence'),
             (self.normalize, 'normalize'),
+            (self.store_features, 'store_features'),
             (self.sample_rate, 'sample_rate'),
             (self.bit_depth, 'bit_depth'),
+            (self.output_format, 'output_format'),
+            (self.compression_level, 'compression_level'),
             (self.include_preview, 'include_preview'),
             (self.fill_blanks, 'fill_blanks'),
             (self.fill_blanks_path, 'fill_blanks_path'),
@@ -330,6 +379,10 @@ class GroupsExporterGUI(QtWidgets.QDialog):
                 widget.stateChanged.connect(lambda val, k=key, w=widget: self.on_config_changed(k, w.isChecked()))
             elif isinstance(widget, QtWidgets.QPushButton) and widget.isCheckable():
                 widget.toggled.connect(lambda val, k=key, w=widget: self.on_config_changed(k, w.isChecked()))
+            elif isinstance(widget, QtWidgets.QComboBox):
+                widget.currentIndexChanged.connect(lambda val, k=key, w=widget: self.on_config_changed(k, w.currentData()))
+            elif isinstance(widget, QtWidgets.QSpinBox):
+                widget.valueChanged.connect(lambda val, k=key: self.on_config_changed(k, val))
 
         # Connect editor-specific signals
         self.matrix_editor.matrix_changed.connect(self.on_matrix_config_changed)
@@ -338,15 +391,15 @@ class GroupsExporterGUI(QtWidgets.QDialog):
     def on_config_changed(self, key, value):
         # Update the specific attribute in the groups_exporter sub-model
         setattr(self.config.groups_exporter, key, value)
-        config_utils.save_config(self.config)
+        config_utils.schedule_save_config(self.config)
 
     def on_matrix_config_changed(self):
         self.config.groups_exporter.matrix_config = self.matrix_editor.get_matrix()
-        config_utils.save_config(self.config)
+        config_utils.schedule_save_config(self.config)
 
     def on_pad_filter_config_changed(self):
         self.config.groups_exporter.pad_filter_config = self.pad_filter_editor.get_pad_filter()
-        config_utils.save_config(self.config)
+        config_utils.schedule_save_config(self.config)
 
     def load_config_to_ui(self):
         c = self.config.groups_exporter
@@ -357,8 +410,11 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         self.proc_output_folder.setText(c.proc_output_folder)
         self.trim_silence.setChecked(c.trim_silence)
         self.normalize.setChecked(c.normalize)
+        self.store_features.setChecked(c.store_features)
         self.sample_rate.setText(c.sample_rate)
         self.bit_depth.setText(c.bit_depth)
+        self.output_format.setCurrentIndex(self.output_format.findData(c.output_format))
+        self.compression_level.setValue(c.compression_level)
         self.skip_existing.setChecked(c.skip_existing)
         self.enable_matrix.setChecked(c.enable_matrix)
         self.matrix_editor.set_matrix(self.config.groups_exporter.matrix_config)
@@ -369,6 +425,11 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         self.fill_blanks_path.setText(c.fill_blanks_path)
         self.bottom_banner.show_terminal_button.setChecked(c.show_terminal)
 
+    def _update_compression_level_state(self):
+        # The compression level only applies to FLAC exports
+        enabled = self.output_format.isEnabled() and self.output_format.currentData() == AudioFormat.FLAC
+        self.compression_level.setEnabled(enabled)
+
     def _update_matrix_editor_state(self):
         enabled = bool(self.json_path.text().strip()) and self.enable_matrix.isChecked()
         self.matrix_editor.setEnabled(enabled)
@@ -386,10 +447,11 @@ class GroupsExporterGUI(QtWidgets.QDialog):
     def set_step2_enabled(self, enabled):
         widgets = [
             self.proc_output_folder, self.proc_output_folder_btn,
-            self.trim_silence, self.normalize,
+            self.trim_silence, self.normalize, self.store_features,
             self.fill_blanks, self.fill_blanks_path, self.fill_blanks_path_btn,
             self.run_process_btn,
             self.sample_rate, self.bit_depth,
+            self.output_format,
             self.include_preview,
             self.skip_existing
         ]
@@ -404,6 +466,7 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         # are correctly enabled/disabled based on both the overall step2 state AND their own checkboxes.
         self._update_matrix_editor_state()
         self._update_pad_filter_editor_state()
+        self._update_compression_level_state()
 
     def on_json_path_changed(self):
         enabled = bool(self.json_path.text().strip())
@@ -489,6 +552,11 @@ class GroupsExporterGUI(QtWidgets.QDialog):
                 QMessageBox.warning(self, "Input Error", "Bit depth must be an integer.")
                 return
 
+        output_format = self.output_format.currentData()
+        if output_format == AudioFormat.FLAC and bit_depth_val not in (None, 8, 16, 24):
+            QMessageBox.warning(self, "Input Error", "FLAC supports bit depths of 8, 16 or 24.")
+            return
+
         fill_blanks_path_val = None
         if self.config.groups_exporter.fill_blanks:
             if self.config.groups_exporter.fill_blanks_path:
@@ -509,7 +577,11 @@ class GroupsExporterGUI(QtWidgets.QDialog):
             fill_blanks=fill_blanks_path_val,
             enable_matrix=self.config.groups_exporter.enable_matrix,
             include_preview=self.config.groups_exporter.include_preview,
-            skip_existing=self.config.groups_exporter.skip_existing
+            skip_existing=self.config.groups_exporter.skip_existing,
+            output_format=output_format,
+            compression_level=self.config.groups_exporter.compression_level,
+            features_db_path=os.path.join(output_folder, 'features.db') if self.config.groups_exporter.store_features else None,
+            cache_mb=config_utils.load_config().audio_cache_mb,  # Set in the Configuration dialog
         )
         self.log_output.append(f"Starting group export process for JSON: {json_path}")
         self.show_loading('Exporting groups...')
@@ -519,8 +591,10 @@ class GroupsExporterGUI(QtWidgets.QDialog):
         self.run_build_btn.setEnabled(False)
         self.run_process_btn.setEnabled(False)
         self.has_output = False
-        self.worker = WorkerThread(target_callable, kwargs, logger_name)
+        pool = self.get_worker_pool() if config_utils.load_config().run_in_process else None  # Set in the Configuration dialog
+        self.worker = WorkerThread(target_callable, kwargs, logger_name, pool=pool)
         self.worker.output_signal.connect(self.on_worker_output)
+        self.worker.progress_signal.connect(self.on_worker_progress)
         self.worker.finished_signal.connect(self.on_subprocess_finished)
         self.worker.start()
 
@@ -7,20 +7,26 @@ from PyQt6.QtWidgets import QMessageBox
 
 from components.ansi_text_edit import AnsiTextEdit
 from components.bottom_banner import BottomBanner
+from components.no_wheel_spinbox import NoWheelSpinBox
 from components.resizable_log_splitter import ResizableLogSplitter
 from dialogs.error_dialog import ErrorDialog
 from dialogs.export_complete_dialog import show_export_complete_dialog
 from models.config import Config
 from processors.previews.build_previews_json import PreviewsJsonBuilder
+from processors.previews.previews_catalog import (CATALOG_FILENAME,
+                                                  PreviewsCatalog, is_catalog)
+from processors.previews.previews_manifest import is_manifest, manifest_len
 from processors.previews.process_previews_json import PreviewsProcessor
 from utils import config_utils
 from utils.bundle_utils import get_bundled_path
+from utils.enums import AudioFormat
+from utils.process_utils import WorkerPool
 from utils.style_utils import apply_style
-from utils.worker_utils import WorkerThread
+from utils.worker_utils import ProgressEstimator, WorkerThread
 
 
 class PreviewsExporterGUI(QtWidgets.QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, worker_pool: WorkerPool | None = None):
         super().__init__(parent)
         self.setWindowIcon(QtGui.QIcon(get_bundled_path("resources/icons/previews.png")))
         self.setWindowTitle('NITools - Previews Exporter')
@@ -30,7 +36,10 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         self.config: Config = config_utils.load_config()
         apply_style(self.config.style)  # Apply style for standalone execution
         self.worker = None
+        self.worker_pool = worker_pool  # Shared by the launcher, or started here when run on its own
+        self.owns_worker_pool = worker_pool is None
         self.progress_dialog = None
+        self.progress_estimator = None
         self.cancelled = False
         self.has_output = False
         self.last_built_json_path = None
@@ -73,6 +82,14 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         output_folder_layout.addWidget(self.output_folder_btn)
         build_form_layout.addRow('Output folder:', output_folder_layout)
 
+        self.use_catalog = QtWidgets.QCheckBox('Incremental catalog')
+        self.use_catalog.setToolTip('Keep the previews in a previews.db catalog that is updated on every run, rescanning only the folders that changed since the last one.')
+        build_form_layout.addRow(self.use_catalog)
+
+        self.compact_manifest = QtWidgets.QCheckBox('Compact JSON')
+        self.compact_manifest.setToolTip('Store every instrument name and folder once in all_previews.json, making it much smaller and faster to load.')
+        build_form_layout.addRow(self.compact_manifest)
+
         scroll_area_build = QtWidgets.QScrollArea()
         scroll_area_build.setWidgetResizable(True)
         scroll_area_build.setWidget(scroll_content_build)
@@ -103,7 +120,7 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         export_form_layout = QtWidgets.QFormLayout()
 
         self.json_path = QtWidgets.QLineEdit()
-        self.json_path.setToolTip('Select the JSON file generated in Step 1 (e.g., all_previews.json).')
+        self.json_path.setToolTip('Select the JSON file or catalog generated in Step 1 (e.g., all_previews.json or previews.db).')
         self.json_path.setPlaceholderText('e.g., C:/Users/YourName/Documents/NITools/PreviewsJSON/all_previews.json')
         self.json_path_btn = QtWidgets.QPushButton('Choose')
         self.json_path_btn.setToolTip('Browse for the JSON file.')
@@ -133,19 +150,33 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         self.trim_silence.setToolTip('If checked, leading and trailing silence will be removed from samples.')
         self.normalize = QtWidgets.QCheckBox('Normalize')
         self.normalize.setToolTip('If checked, audio samples will be normalized to a standard loudness level.')
+        self.store_features = QtWidgets.QCheckBox('Store audio features')
+        self.store_features.setToolTip('If checked, duration, peak, RMS, leading silence, channels and sample rate of every source are saved to features.db in the output folder, ready to be queried without decoding the library again.')
         self.sample_rate = QtWidgets.QLineEdit()
         self.sample_rate.setPlaceholderText('Sample rate (e.g. 48000)')
         self.sample_rate.setToolTip('Set the sample rate for exported audio (e.g., 44100, 48000). Leave blank for original.')
         self.bit_depth = QtWidgets.QLineEdit()
         self.bit_depth.setPlaceholderText('Bit depth (e.g. 16)')
         self.bit_depth.setToolTip('Set the bit depth for exported audio (e.g., 16, 24). Leave blank for original.')
+        self.output_format = QtWidgets.QComboBox()
+        for audio_format in AudioFormat:
+            self.output_format.addItem('OGG (original)' if audio_format == AudioFormat.OGG else audio_format.value, audio_format)
+        self.output_format.setToolTip('Select the format of the exported audio. FLAC is lossless and roughly halves the size of the files. OGG copies the original previews without converting them, the smallest and fastest option.')
+        self.compression_level = NoWheelSpinBox()
+        self.compression_level.setRange(0, 8)
+        self.compression_level.setToolTip('Set the FLAC compression level, from 0 (fastest) to 8 (smallest files).')
         options_layout.addWidget(self.skip_existing)
         options_layout.addWidget(self.trim_silence)
         options_layout.addWidget(self.normalize)
+        options_layout.addWidget(self.store_features)
         options_layout.addWidget(QtWidgets.QLabel('Sample rate:'))
         options_layout.addWidget(self.sample_rate)
         options_layout.addWidget(QtWidgets.QLabel('Bit depth:'))
         options_layout.addWidget(self.bit_depth)
+        options_layout.addWidget(QtWidgets.QLabel('Format:'))
+        options_layout.addWidget(self.output_format)
+        options_layout.addWidget(QtWidgets.QLabel('FLAC compression level:'))
+        options_layout.addWidget(self.compression_level)
         options_group.setLayout(options_layout)
         export_form_layout.addRow(options_group)
 
@@ -184,7 +215,7 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         self.tabs.addTab(self.tab_export, 'Export Previews')
 
         # --- Log/output ---
-        self.log_output = AnsiTextEdit()
+        self.log_output = AnsiTextEdit(self.config.max_log_lines)
         self.log_output.setReadOnly(True)
 
         # Create a splitter to make the log_output resizable
@@ -202,24 +233,57 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         self.setup_config_signals()
         self.on_json_path_changed()  # Call once to set initial state based on json_path
         self.toggle_terminal_visibility(self.config.previews_exporter.show_terminal)
+        if self.config.run_in_process:
+            self.get_worker_pool().start()  # Warms up while the options are set, so the first run starts right away
 
         self.skip_native_browser_preview_library.toggled.connect(self._update_find_real_instrument_folder_state)
         self._update_find_real_instrument_folder_state(self.skip_native_browser_preview_library.isChecked())
+        self.output_format.currentIndexChanged.connect(self._update_compression_level_state)
+        self.output_format.currentIndexChanged.connect(self._update_conversion_options_state)
+        self.use_catalog.toggled.connect(self._update_compact_manifest_state)
+        self._update_compact_manifest_state(self.use_catalog.isChecked())
 
     def _update_find_real_instrument_folder_state(self, checked):
         self.find_real_instrument_folder.setEnabled(not checked)
 
+    def _update_conversion_options_state(self):
+        # The original OGG previews are copied as they are, so there is nothing to trim, normalize or resample
+        enabled = self.output_format.isEnabled() and self.output_format.currentData() != AudioFormat.OGG
+        for widget in (self.trim_silence, self.normalize, self.sample_rate, self.bit_depth):
+            widget.setEnabled(enabled)
+
+    def _update_compact_manifest_state(self, checked):
+        # The catalog replaces the JSON file
+        self.compact_manifest.setEnabled(not checked)
+
+    def _update_compression_level_state(self):
+        # The compression level only applies to FLAC exports
+        enabled = self.output_format.isEnabled() and self.output_format.currentData() == AudioFormat.FLAC
+        self.compression_level.setEnabled(enabled)
+
     def closeEvent(self, event):
         # Save current window size to config
         self.config.previews_exporter.width = self.width()
         self.config.previews_exporter.height = self.height()
         config_utils.save_config(self.config)
+        if self.owns_worker_pool and self.worker_pool:
+            self.worker_pool.shutdown()
         super().closeEvent(event)
 
+    def done(self, result):
+        # Closing with Esc rejects the dialog without a closeEvent, so write the changes still waiting to be saved
+        config_utils.flush_config()
+        super().done(result)
+
+    def get_worker_pool(self) -> WorkerPool:
+        if self.worker_pool is None:
+            self.worker_pool = WorkerPool()
+        return self.worker_pool
+
     def toggle_terminal_visibility(self, state):
         self.log_output.setVisible(state)
         self.config.previews_exporter.show_terminal = state
-        config_utils.save_config(self.config)
+        config_utils.schedule_save_config(self.config)
 
     def show_loading(self, message):
         self.cancelled = False
@@ -228,6 +292,10 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         self.progress_dialog.setWindowTitle('Please wait')
         self.progress_dialog.setMinimumDuration(0)
         self.progress_dialog.canceled.connect(self.cancel_worker)
+        # Stays open at 100%, it is closed when the worker finishes
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_estimator = ProgressEstimator()
         self.progress_dialog.show()
 
     def hide_loading(self):
@@ -245,6 +313,13 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
             self.run_process_btn.setEnabled(True)
             self.hide_loading()
 
+    def on_worker_progress(self, stage, done, total, bytes_done):
+        if not self.progress_dialog:
+            return
+        self.progress_dialog.setMaximum(total)  # 0 keeps the busy indicator when the total is unknown
+        self.progress_dialog.setValue(min(done, total))
+        self.progress_dialog.setLabelText(self.progress_estimator.describe(stage, done, total, bytes_done))
+
     def on_worker_output(self, text):
         self.log_output.append(text)
         self.has_output = True
@@ -283,16 +358,25 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
                     # Check if built JSON has previews
                     if self.last_built_json_path and os.path.exists(self.last_built_json_path):
                         try:
-                            with open(self.last_built_json_path, 'r') as f:
-                                data = json.load(f)
-                                if isinstance(data, list) and len(data) == 0:
-                                    # Empty JSON result
-                                    self.log_output.append("0 previews processed.\n")
-                                    QMessageBox.warning(self, "No Previews Processed", "The process completed but no previews were found or processed.")
+                            if is_catalog(self.last_built_json_path):
+                                catalog = PreviewsCatalog(self.last_built_json_path)
+                                previews_count = catalog.count()
+                                catalog.close()
+                            else:
+                                with open(self.last_built_json_path, 'r') as f:
+                                    data = json.load(f)
+                                if is_manifest(data):
+                                    previews_count = manifest_len(data)
                                 else:
-                                    # Success with previews
-                                    self.tabs.setCurrentIndex(1)
-                                    QMessageBox.information(self, "Process Complete", "Previews JSON file has been successfully built!")
+                                    previews_count = len(data) if isinstance(data, list) else None
+                            if previews_count == 0:
+                                # Empty JSON result
+                                self.log_output.append("0 previews processed.\n")
+                                QMessageBox.warning(self, "No Previews Processed", "The process completed but no previews were found or processed.")
+                            else:
+                                # Success with previews
+                                self.tabs.setCurrentIndex(1)
+                                QMessageBox.information(self, "Process Complete", "Previews JSON file has been successfully built!")
                         except Exception as e:
                             # Unexpected JSON read error → still treat as success
                             self.log_output.append(f"Warning: Could not verify JSON file: {e}\n")
@@ -326,12 +410,17 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         # Save config on change, the keys here should match the attribute names in PreviewsExporterConfig
         for widget, key in [
             (self.output_folder, 'output_folder'),
+            (self.use_catalog, 'use_catalog'),
+            (self.compact_manifest, 'compact_manifest'),
             (self.json_path, 'json_path'),
             (self.proc_output_folder, 'proc_output_folder'),
             (self.trim_silence, 'trim_silence'),
             (self.normalize, 'normalize'),
+            (self.store_features, 'store_features'),
             (self.sample_rate, 'sample_rate'),
             (self.bit_depth, 'bit_depth'),
+            (self.output_format, 'output_format'),
+            (self.compression_level, 'compression_level'),
             (self.skip_existing, 'skip_existing'),
             (self.skip_maschine_folders, 'skip_maschine_folders'),
             (self.skip_battery_kits, 'skip_battery_kits'),
@@ -345,21 +434,30 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
                 widget.stateChanged.connect(lambda val, k=key, w=widget: self.on_config_changed(k, w.isChecked()))
             elif isinstance(widget, QtWidgets.QPushButton) and widget.isCheckable():
                 widget.toggled.connect(lambda val, k=key, w=widget: self.on_config_changed(k, w.isChecked()))
+            elif isinstance(widget, QtWidgets.QComboBox):
+                widget.currentIndexChanged.connect(lambda val, k=key, w=widget: self.on_config_changed(k, w.currentData()))
+            elif isinstance(widget, QtWidgets.QSpinBox):
+                widget.valueChanged.connect(lambda val, k=key: self.on_config_changed(k, val))
 
     def on_config_changed(self, key, value):
         # Update the specific attribute in the previews_exporter sub-model
         setattr(self.config.previews_exporter, key, value)
-        config_utils.save_config(self.config)
+        config_utils.schedule_save_config(self.config)
 
     def load_config_to_ui(self):
         c = self.config.previews_exporter
         self.output_folder.setText(c.output_folder)
+        self.use_catalog.setChecked(c.use_catalog)
+        self.compact_manifest.setChecked(c.compact_manifest)
         self.json_path.setText(c.json_path)
         self.proc_output_folder.setText(c.proc_output_folder)
         self.trim_silence.setChecked(c.trim_silence)
         self.normalize.setChecked(c.normalize)
+        self.store_features.setChecked(c.store_features)
         self.sample_rate.setText(c.sample_rate)
         self.bit_depth.setText(c.bit_depth)
+        self.output_format.setCurrentIndex(self.output_format.findData(c.output_format))
+        self.compression_level.setValue(c.compression_level)
         self.skip_existing.setChecked(c.skip_existing)
         self.skip_maschine_folders.setChecked(c.skip_maschine_folders)
         self.skip_battery_kits.setChecked(c.skip_battery_kits)
@@ -370,9 +468,10 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
     def set_step2_enabled(self, enabled):
         widgets = [
             self.proc_output_folder, self.proc_output_folder_btn,
-            self.trim_silence, self.normalize,
+            self.trim_silence, self.normalize, self.store_features,
             self.run_process_btn,
             self.sample_rate, self.bit_depth,
+            self.output_format,
             self.skip_existing,
             self.skip_maschine_folders,
             self.skip_battery_kits,
@@ -381,6 +480,8 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         ]
         for w in widgets:
             w.setEnabled(enabled)
+        self._update_compression_level_state()
+        self._update_conversion_options_state()
 
     def on_json_path_changed(self):
         enabled = bool(self.json_path.text().strip())
@@ -392,7 +493,7 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
             self.output_folder.setText(folder)
 
     def choose_json_file(self):
-        file, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Select JSON File', self.json_path.text(), 'JSON Files (*.json)')
+        file, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Select JSON File', self.json_path.text(), 'Previews Files (*.json *.db)')
         if file:
             self.json_path.setText(file)
 
@@ -407,12 +508,13 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
             QMessageBox.warning(self, "Input Error", "Please select an output folder for the JSON file.")
             return
 
-        builder = PreviewsJsonBuilder(output_folder=output_folder)
+        use_catalog = self.use_catalog.isChecked()
+        builder = PreviewsJsonBuilder(output_folder=output_folder, use_catalog=use_catalog, compact=self.compact_manifest.isChecked())
         self.log_output.append(f"Starting JSON build process for output folder: {output_folder}")
         self.show_loading('Building previews JSON...')
         self.run_worker(builder.run, {}, logger_name="PreviewsBuilder")
 
-        json_path = os.path.join(output_folder, 'all_previews.json')
+        json_path = os.path.join(output_folder, CATALOG_FILENAME if use_catalog else 'all_previews.json')
         self.json_path.setText(json_path)
         self.proc_output_folder.setText(os.path.abspath('./out/previews'))
         self.last_built_json_path = json_path
@@ -444,6 +546,12 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
                 QMessageBox.warning(self, "Input Error", "Bit depth must be an integer.")
                 return
 
+        output_format = self.output_format.currentData()
+        if output_format == AudioFormat.FLAC and bit_depth_val not in (None, 8, 16, 24):
+            QMessageBox.warning(self, "Input Error", "FLAC supports bit depths of 8, 16 or 24.")
+            return
+
+        performance_config = config_utils.load_config()  # Set in the Configuration dialog
         processor = PreviewsProcessor(
             json_path=json_path,
             output_folder=output_folder,
@@ -456,6 +564,10 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
             skip_battery_kits=self.config.previews_exporter.skip_battery_kits,
             skip_native_browser_preview_library=self.config.previews_exporter.skip_native_browser_preview_library,
             find_real_instrument_folder=self.config.previews_exporter.find_real_instrument_folder,
+            output_format=output_format,
+            compression_level=self.config.previews_exporter.compression_level,
+            features_db_path=os.path.join(output_folder, 'features.db') if self.config.previews_exporter.store_features else None,
+            workers=performance_config.export_workers,
         )
         self.log_output.append(f"Starting preview export process for JSON: {json_path}")
         self.show_loading('Exporting previews...')
@@ -466,8 +578,10 @@ class PreviewsExporterGUI(QtWidgets.QDialog):
         self.run_build_btn.setEnabled(False)
         self.run_process_btn.setEnabled(False)
         self.has_output = False  # Reset flag before new process
-        self.worker = WorkerThread(target_callable, kwargs, logger_name)
+        pool = self.get_worker_pool() if config_utils.load_config().run_in_process else None  # Set in the Configuration dialog
+        self.worker = WorkerThread(target_callable, kwargs, logger_name, pool=pool)
         self.worker.output_signal.connect(self.on_worker_output)
+        self.worker.progress_signal.connect(self.on_worker_progress)
         self.worker.finished_signal.connect(self.on_subprocess_finished)
         self.worker.start()
 
@@ -1,9 +1,16 @@
 import re
 
-from PyQt6 import QtGui, QtWidgets
+from PyQt6 import QtCore, QtGui, QtWidgets
 
 
-class AnsiTextEdit(QtWidgets.QTextEdit):
+class AnsiTextEdit(QtWidgets.QPlainTextEdit):
+    """
+    Read-only log view for ANSI-colored lines. Appended lines are buffered and inserted together on a timer,
+    and the document drops its oldest lines by itself once it holds max_log_lines.
+    """
+    FLUSH_INTERVAL_MS = 75
+    ANSI_ESCAPE = re.compile(r'\x1b\[([0-9;]*)([ABCDHJKSTfmnsu])')
+
     ANSI_COLOR_MAP = {
         "30": "black",
         "31": "red",
@@ -45,92 +52,119 @@ class AnsiTextEdit(QtWidgets.QTextEdit):
     def __init__(self, max_log_lines: int = 200, parent=None):
         super().__init__(parent)
         self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
         self.setFont(QtGui.QFont("Consolas", 10))  # Monospaced font for better log readability
-        self.max_log_lines = max_log_lines
+        self.setMaximumBlockCount(max_log_lines)
+        self._pending = []
+        self._styles = {}  # (styles, SGR params) -> styles, the parsed escape codes
+        self._formats = {}  # styles -> QTextCharFormat
+        self._flush_timer = QtCore.QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(self.FLUSH_INTERVAL_MS)
+        self._flush_timer.timeout.connect(self.flush)
+
+    @property
+    def max_log_lines(self) -> int:
+        return self.maximumBlockCount()
+
+    @max_log_lines.setter
+    def max_log_lines(self, value: int):
+        self.setMaximumBlockCount(value)
 
     def append(self, text):
-        html_text = self._ansi_to_html(text)
-        super().append(html_text)
-
-        # Trim old logs
-        doc = self.document()
-        if doc.blockCount() > self.max_log_lines:
-            cursor = QtGui.QTextCursor(doc)
-            cursor.movePosition(QtGui.QTextCursor.MoveOperation.Start)
-            for _ in range(doc.blockCount() - self.max_log_lines):
-                cursor.select(QtGui.QTextCursor.SelectionType.BlockUnderCursor)
-                cursor.removeSelectedText()
-            cursor.deleteChar()  # remove the trailing newline
-            self.setTextCursor(cursor)
-
-        # Ensure scrollbar is at the bottom after all operations (append and trim)
-        final_cursor = self.textCursor()
-        final_cursor.movePosition(QtGui.QTextCursor.MoveOperation.End)
-        self.setTextCursor(final_cursor)
-        self.ensureCursorVisible()
-
-    def _ansi_to_html(self, ansi_text):
-        # Regex to find ANSI escape codes
-        ansi_escape = re.compile(r'\x1b\[([0-9;]*)([ABCDHJKSTfmnsu])')
-
-        parts = []
+        self._pending.append(text)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def flush(self):
+        """Insert the buffered lines in a single edit and scroll to the bottom."""
+        self._flush_timer.stop()
+        if not self._pending:
+            return
+        lines = self._pending[-self.max_log_lines:]  # Older lines would be dropped right away
+        self._pending = []
+
+        cursor = QtGui.QTextCursor(self.document())
+        cursor.movePosition(QtGui.QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+        for line in lines:
+            if not self.document().isEmpty():
+                cursor.insertBlock()
+            for text, char_format in self._ansi_runs(line):
+                cursor.insertText(text, char_format)
+        cursor.endEditBlock()
+
+        scrollbar = self.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+    def toPlainText(self) -> str:
+        self.flush()
+        return super().toPlainText()
+
+    def clear(self):
+        self._pending = []
+        super().clear()
+
+    def _ansi_runs(self, ansi_text):
+        """Split a line into (text, QTextCharFormat) runs, following its SGR (Select Graphic Rendition) codes."""
+        runs = []
         last_pos = 0
-        current_styles = []
+        current_styles = ()
 
-        for match in ansi_escape.finditer(ansi_text):
+        for match in self.ANSI_ESCAPE.finditer(ansi_text):
             # Add text before the escape code
             if match.start() > last_pos:
-                parts.append(self._apply_styles(ansi_text[last_pos:match.start()], current_styles))
-
-            params = match.group(1).split(';') if match.group(1) else []
-            command = match.group(2)
-
-            if command == 'm':  # SGR (Select Graphic Rendition) command
-                for param in params:
-                    if param == '0':  # Reset all attributes
-                        current_styles = []
-                    elif param == '1':  # Bold
-                        if 'bold' not in current_styles:
-                            current_styles.append('bold')
-                    elif param == '3':  # Italic (not directly supported by QTextEdit, but can be simulated with <em>)
-                        if 'italic' not in current_styles:
-                            current_styles.append('italic')
-                    elif param == '4':  # Underline
-                        if 'underline' not in current_styles:
-                            current_styles.append('underline')
-                    elif param in self.ANSI_COLOR_MAP:  # Foreground color
-                        self._remove_style_type(current_styles, 'color')
-                        current_styles.append(f'color:{self.ANSI_COLOR_MAP[param]}')
-                    elif param in self.ANSI_BACKGROUND_COLOR_MAP:  # Background color
-                        self._remove_style_type(current_styles, 'background-color')
-                        current_styles.append(f'background-color:{self.ANSI_BACKGROUND_COLOR_MAP[param]}')
-
+                runs.append((ansi_text[last_pos:match.start()], self._char_format(current_styles)))
+            if match.group(2) == 'm':
+                current_styles = self._apply_sgr(current_styles, match.group(1))
             last_pos = match.end()
 
         # Add any remaining text after the last escape code
         if last_pos < len(ansi_text):
-            parts.append(self._apply_styles(ansi_text[last_pos:], current_styles))
-
-        return ''.join(parts)
-
-    def _apply_styles(self, text, styles):
-        if not styles:
-            return text
-
-        html_styles = []
-        if 'bold' in styles:
-            html_styles.append('font-weight:bold')
-        if 'italic' in styles:
-            html_styles.append('font-style:italic')
-        if 'underline' in styles:
-            html_styles.append('text-decoration:underline')
-
-        for style in styles:
-            if style.startswith('color:') or style.startswith('background-color:'):
-                html_styles.append(style)
-
-        style_str = ';'.join(html_styles)
-        return f'<span style="{style_str}">{text}</span>'
+            runs.append((ansi_text[last_pos:], self._char_format(current_styles)))
+        return runs
+
+    def _apply_sgr(self, styles: tuple, params: str) -> tuple:
+        key = (styles, params)
+        if key not in self._styles:
+            current_styles = list(styles)
+            for param in params.split(';') if params else []:
+                if param == '0':  # Reset all attributes
+                    current_styles = []
+                elif param == '1':  # Bold
+                    if 'bold' not in current_styles:
+                        current_styles.append('bold')
+                elif param == '3':  # Italic
+                    if 'italic' not in current_styles:
+                        current_styles.append('italic')
+                elif param == '4':  # Underline
+                    if 'underline' not in current_styles:
+                        current_styles.append('underline')
+                elif param in self.ANSI_COLOR_MAP:  # Foreground color
+                    self._remove_style_type(current_styles, 'color')
+                    current_styles.append(f'color:{self.ANSI_COLOR_MAP[param]}')
+                elif param in self.ANSI_BACKGROUND_COLOR_MAP:  # Background color
+                    self._remove_style_type(current_styles, 'background-color')
+                    current_styles.append(f'background-color:{self.ANSI_BACKGROUND_COLOR_MAP[param]}')
+            self._styles[key] = tuple(current_styles)
+        return self._styles[key]
+
+    def _char_format(self, styles: tuple) -> QtGui.QTextCharFormat:
+        if styles not in self._formats:
+            char_format = QtGui.QTextCharFormat()
+            for style in styles:
+                if style == 'bold':
+                    char_format.setFontWeight(QtGui.QFont.Weight.Bold)
+                elif style == 'italic':
+                    char_format.setFontItalic(True)
+                elif style == 'underline':
+                    char_format.setFontUnderline(True)
+                elif style.startswith('color:'):
+                    char_format.setForeground(QtGui.QColor(style.split(':', 1)[1]))
+                elif style.startswith('background-color:'):
+                    char_format.setBackground(QtGui.QColor(style.split(':', 1)[1]))
+            self._formats[styles] = char_format
+        return self._formats[styles]
 
     def _remove_style_type(self, current_styles, style_type):
         # Remove any existing style of the same type (e.g., only one foreground color at a time)
@@ -27,4 +27,4 @@ class ResizableLogSplitter(QtWidgets.QSplitter):
 
     def save_log_panel_sizes(self):
         self.config.log_panel_sizes = self.sizes()
-        config_utils.save_config(self.config)
+        config_utils.schedule_save_config(self.config)
@@ -11,7 +11,7 @@ from PyQt6.QtWidgets import (QCheckBox, QColorDialog, QComboBox, QDialog,
 
 from models.config import Config
 from utils.config_utils import load_config, save_config
-from utils.constants import LOGS_PATH, get_data_dir
+from utils.constants import LOGS_PATH, get_data_dir, get_dir
 from utils.enums import Style
 from utils.logger import Logger
 from utils.style_utils import apply_style
@@ -76,6 +76,32 @@ class ConfigurationDialog(QDialog):
         logging_group_box.setLayout(logging_layout)
         main_layout.addWidget(logging_group_box)
 
+        # Performance Section
+        performance_group_box = QGroupBox("Performance")
+        performance_layout = QFormLayout()
+        performance_layout.setFieldGrowthPolicy(QFormLayout.FieldGrowthPolicy.ExpandingFieldsGrow)
+
+        # Audio Cache Size
+        self.audio_cache_spinbox = QSpinBox()
+        self.audio_cache_spinbox.setRange(0, 16384)
+        self.audio_cache_spinbox.setSingleStep(64)
+        self.audio_cache_spinbox.setSuffix(" MB")
+        self.audio_cache_spinbox.setToolTip("Memory used by the Groups Exporter to keep decoded audio of sources exported more than once in a run. Set to 0 to disable it.")
+        performance_layout.addRow("Audio Cache:", self.audio_cache_spinbox)
+
+        # Export Workers
+        self.export_workers_spinbox = QSpinBox()
+        self.export_workers_spinbox.setRange(1, 64)
+        self.export_workers_spinbox.setToolTip("Number of previews converted in parallel. Up to the number of CPU cores usually gives the fastest exports.")
+        performance_layout.addRow("Export Workers:", self.export_workers_spinbox)
+
+        # Run In Process
+        self.run_in_process_checkbox = QCheckBox("Run Exports in a Separate Process")
+        self.run_in_process_checkbox.setToolTip("Keeps the window responsive during builds and exports. Disable it to run them inside the app instead.")
+        performance_layout.addRow("", self.run_in_process_checkbox)
+        performance_group_box.setLayout(performance_layout)
+        main_layout.addWidget(performance_group_box)
+
         # UI Section
         ui_group_box = QGroupBox("User Interface")
         ui_layout = QFormLayout()
@@ -147,6 +173,9 @@ class ConfigurationDialog(QDialog):
         self.config = load_config()
         self.style_dropdown.setCurrentText(self.config.style.capitalize())
         self.max_log_lines_spinbox.setValue(self.config.max_log_lines)
+        self.audio_cache_spinbox.setValue(self.config.audio_cache_mb)
+        self.export_workers_spinbox.setValue(self.config.export_workers)
+        self.run_in_process_checkbox.setChecked(self.config.run_in_process)
         self.set_custom_color_display(self.config.custom_color)
         self.enable_custom_color_checkbox.setChecked(self.config.enable_custom_color)
         self.toggle_custom_color_widgets(self.config.enable_custom_color)  # Call to set initial state
@@ -188,7 +217,7 @@ class ConfigurationDialog(QDialog):
         self._open_path(self.path_backups_edit.text())
 
     def open_logs_path(self):
-        self._open_path(LOGS_PATH)
+        self._open_path(get_dir("logs"))
 
     def open_config_path(self):
         self._open_path(get_data_dir())
@@ -219,6 +248,15 @@ class ConfigurationDialog(QDialog):
         # Save Max Log Lines
         self.config.max_log_lines = self.max_log_lines_spinbox.value()
 
+        # Save Audio Cache Size
+        self.config.audio_cache_mb = self.audio_cache_spinbox.value()
+
+        # Save Export Workers
+        self.config.export_workers = self.export_workers_spinbox.value()
+
+        # Save Run In Process
+        self.config.run_in_process = self.run_in_process_checkbox.isChecked()
+
         # Save Custom Color
         self.config.custom_color = self.current_custom_color
         self.config.enable_custom_color = self.enable_custom_color_checkbox.isChecked()
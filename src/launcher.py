@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import os
 import sys
 import traceback
@@ -8,8 +9,6 @@ from PyQt6 import QtCore, QtGui, QtWidgets
 from PyQt6.QtCore import QSharedMemory
 from PyQt6.QtWidgets import QApplication, QMessageBox
 
-from apps.groups_exporter_gui import GroupsExporterGUI
-from apps.previews_exporter_gui import PreviewsExporterGUI
 from components.version_label import VersionLabel
 from dialogs.configuration_dialog import ConfigurationDialog
 from dialogs.error_dialog import ErrorDialog
@@ -17,6 +16,7 @@ from utils import logger
 from utils.bundle_utils import get_bundled_path
 from utils.config_utils import load_config
 from utils.logger import Logger
+from utils.process_utils import WorkerPool
 from utils.style_utils import apply_style, set_font_properties
 
 logger = Logger.get_logger("Launcher", logging.DEBUG)
@@ -45,8 +45,13 @@ class MainGUI(QtWidgets.QMainWindow):
         self.layout.setSpacing(15)
 
         self.version_label = VersionLabel()
+        self.worker_pool = WorkerPool()  # Shared by the exporters, started when first needed
         self.init_ui()
 
+    def closeEvent(self, event):
+        self.worker_pool.shutdown()
+        super().closeEvent(event)
+
     def init_ui(self):
         # Create a top header container for the config button and centered title
         header_widget = QtWidgets.QWidget()
@@ -244,13 +249,16 @@ class MainGUI(QtWidgets.QMainWindow):
         return config_btn
 
     def launch_tool(self, tool_class):
-        tool_window = tool_class(self)
+        tool_window = tool_class(self, worker_pool=self.worker_pool)
         tool_window.exec()
 
+    # The exporters are imported when opened, as they load the audio libraries
     def launch_groups_exporter(self):
+        from apps.groups_exporter_gui import GroupsExporterGUI
         self.launch_tool(GroupsExporterGUI)
 
     def launch_previews_exporter(self):
+        from apps.previews_exporter_gui import PreviewsExporterGUI
         self.launch_tool(PreviewsExporterGUI)
 
     def launch_config(self):
@@ -339,4 +347,5 @@ def main():
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Lets the bundled executable start the export worker processes
     main()
@@ -12,6 +12,9 @@ class Config(BaseModel):
     version: str = CONFIG_VERSION
     style: Style = Style.AUTO
     max_log_lines: int = 200
+    audio_cache_mb: int = 256
+    export_workers: int = 1
+    run_in_process: bool = True
     log_panel_sizes: list[int] = []
     groups_exporter: GroupsExporterConfig = GroupsExporterConfig()
     previews_exporter: PreviewsExporterConfig = PreviewsExporterConfig()
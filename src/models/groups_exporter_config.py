@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 
 from models.matrix_config import MatrixConfig
 from models.pad_filter_config import PadFilterConfig
+from utils.enums import AudioFormat
 
 
 class GroupsExporterConfig(BaseModel):
@@ -15,8 +16,11 @@ class GroupsExporterConfig(BaseModel):
     normalize: bool = Field(default=True, description="Normalize samples")
     sample_rate: str = Field(default="", description="Target sample rate (e.g., '48000')")
     bit_depth: str = Field(default="", description="Target bit depth (e.g., '16')")
+    output_format: AudioFormat = Field(default=AudioFormat.WAV, description="Output audio format")
+    compression_level: int = Field(default=5, description="FLAC compression level, from 0 (fastest) to 8 (smallest)")
     enable_matrix: bool = Field(default=True, description="Enable pad reorder matrix")
     skip_existing: bool = Field(default=True, description="Skip processing if output file already exists")
+    store_features: bool = Field(default=False, description="Store audio features of the sources in features.db inside the output folder")
     matrix_config: MatrixConfig = Field(default_factory=MatrixConfig, description="Configuration for pad reordering matrix")
     filter_pads: bool = Field(default=True, description="Enable pad filtering by keywords")
     pad_filter_config: PadFilterConfig = Field(default_factory=PadFilterConfig, description="Configuration for pad filtering keywords")
@@ -1,17 +1,24 @@
 from pydantic import BaseModel, Field
 
+from utils.enums import AudioFormat
+
 
 class PreviewsExporterConfig(BaseModel):
     """Configuration model for the Previews Exporter GUI."""
     input_folder: str = Field(default="./in", description="Input folder for .nifiles")
     output_folder: str = Field(default="./out", description="Output folder for JSON and TXT files")
     json_path: str = Field(default="", description="Path to the generated JSON file")
+    use_catalog: bool = Field(default=False, description="Build an incremental previews.db catalog instead of all_previews.json")
+    compact_manifest: bool = Field(default=False, description="Write all_previews.json as a compact manifest")
     proc_output_folder: str = Field(default="./out/previews", description="Output folder for processed audio previews")
     trim_silence: bool = Field(default=True, description="Trim silence from samples")
     normalize: bool = Field(default=True, description="Normalize samples")
     sample_rate: str = Field(default="", description="Target sample rate (e.g., '48000')")
     bit_depth: str = Field(default="", description="Target bit depth (e.g., '16')")
+    output_format: AudioFormat = Field(default=AudioFormat.WAV, description="Output audio format")
+    compression_level: int = Field(default=5, description="FLAC compression level, from 0 (fastest) to 8 (smallest)")
     skip_existing: bool = Field(default=True, description="Skip processing if output file already exists")
+    store_features: bool = Field(default=False, description="Store audio features of the sources in features.db inside the output folder")
     skip_maschine_folders: bool = Field(default=True, description="Skip folders containing .mxgrp files (Maschine groups)")
     skip_battery_kits: bool = Field(default=True, description="Skip files ending with .nbkt.ogg (Battery kits)")
     skip_native_browser_preview_library: bool = Field(default=True, description="Skip 'Native Browser Preview Library' folder")
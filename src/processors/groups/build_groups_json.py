@@ -307,10 +307,12 @@ class GroupsJsonBuilder:
 
             all_groups = []
 
-            for mxgrp_path in mxgrp_files:
+            for done, mxgrp_path in enumerate(mxgrp_files):
                 if worker_instance and worker_instance.cancel_requested():  # Check for cancellation
                     logger.info("Groups JSON build cancelled by user.")
                     return 1  # Return non-zero for cancellation
+                if worker_instance:
+                    worker_instance.report_progress("Reading groups", done, len(mxgrp_files))
 
                 try:
                     group_data = process_mxgrp_file(mxgrp_path, self.output_folder, generate_txt=self.generate_txt)
@@ -326,6 +328,9 @@ class GroupsJsonBuilder:
                 except Exception as e:
                     logger.error(f"Error processing '{mxgrp_path}': {e}")
 
+            if worker_instance:
+                worker_instance.report_progress("Reading groups", len(mxgrp_files), len(mxgrp_files))
+
             combined_json_path = os.path.join(self.output_folder, self.combined_json_name)
             with open(combined_json_path, "w", encoding="utf-8") as f:
                 json.dump(all_groups, f, indent=2, ensure_ascii=False)
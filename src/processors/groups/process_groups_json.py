@@ -4,15 +4,21 @@ import os
 import re
 import shutil
 import sys
+from collections import Counter
 from pathlib import Path
 
 from models.matrix_config import DEFAULT_MATRIX, MatrixConfig
 from models.pad_filter_config import DEFAULT_PAD_FILTER, PadFilterConfig
-from utils.audio_utils import trim_and_normalize_wav
+from utils.audio_utils import (DEFAULT_CACHE_MB, MAX_FLAC_COMPRESSION_LEVEL,
+                               OutputProfile, add_profile_argument,
+                               output_filename, parse_profiles)
+from utils.enums import AudioFormat
 from utils.logger import Logger
 
 logger = Logger.get_logger("GroupsProcessor")
 
+PROFILE_FORMATS = (AudioFormat.WAV, AudioFormat.FLAC)  # Group samples are not OGG previews, so they cannot be passed through
+
 
 def pick_multisample_path(paths):
     # Prioritize _C4, _C3
@@ -32,6 +38,11 @@ def pick_multisample_path(paths):
     # Fallback to the first path
     return paths[0]
 
+def get_source_path(base_path, sample):
+    if sample['type'] == 'multisample':
+        return os.path.join(base_path, pick_multisample_path(sample['paths']))
+    return os.path.join(base_path, sample['paths'])
+
 class GroupsProcessor:
     def __init__(
         self,
@@ -47,7 +58,12 @@ class GroupsProcessor:
         bit_depth=None,
         enable_matrix=True,
         include_preview=False,
-        skip_existing=False
+        skip_existing=False,
+        output_format=AudioFormat.WAV,
+        compression_level=5,
+        features_db_path=None,
+        cache_mb=DEFAULT_CACHE_MB,
+        profiles=None
     ):
         self.json_path = json_path
         self.output_folder = output_folder
@@ -62,9 +78,50 @@ class GroupsProcessor:
         self.enable_matrix = enable_matrix
         self.include_preview = include_preview
         self.skip_existing = skip_existing
+        self.output_format = AudioFormat(output_format)
+        self.compression_level = compression_level
+        self.features_db_path = features_db_path
+        self.cache_mb = cache_mb
+        # Every source is decoded once and written to each profile, the first one being the main output
+        self.profiles = profiles or [OutputProfile(output_folder, sample_rate, bit_depth, self.output_format)]
+
+    def get_targets(self, relative_folder, filename):
+        """Return the (path, settings) of filename in every profile, leaving out existing files when skipping them."""
+        targets = []
+        for profile in self.profiles:
+            target_path = os.path.join(profile.output_folder, relative_folder, output_filename(filename, profile.format))
+            if self.skip_existing and os.path.exists(target_path):
+                logger.info(f"Skipping existing file: {target_path}")
+                continue
+            targets.append((target_path, profile.settings(self.trim_silence, self.normalize, self.compression_level)))
+        return targets
+
+    @staticmethod
+    def copy_source(source_path, targets, filename):
+        """
+        Copy the source as is next to every target after its conversion failed, returning the copies.
+        The targets written before the failure are removed first, so a group folder never holds both.
+        """
+        for target_path, _ in targets:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+        target_paths = [os.path.join(os.path.dirname(target_path), filename) for target_path, _ in targets]
+        for target_path in target_paths:
+            shutil.copy2(source_path, target_path)
+        return target_paths
 
     def run(self, worker_instance=None):  # Accept worker_instance
+        # Imported here, so the command line parses its arguments (e.g. --help) without loading numpy and libsndfile
+        from utils.audio_converter import Converter
+        from utils.feature_utils import FeatureDatabase
+        feature_db = None
+        converter = None
         try:
+            if self.features_db_path:
+                feature_db = FeatureDatabase(self.features_db_path)
+            # Reuses its buffers across every sample of the export and caches the sources used more than once
+            converter = Converter(collect_features=feature_db is not None, cache_mb=self.cache_mb)
+
             with open(self.json_path, 'r', encoding='utf-8') as f:
                 groups = json.load(f)
 
@@ -92,18 +149,24 @@ class GroupsProcessor:
                         filtered_groups.append(group)
                 groups = filtered_groups
 
-            for group in groups:
+            # Only these sources and the blank fillers are kept in the cache, the others are never requested again
+            source_uses = Counter(get_source_path(group['path'], s) for group in groups for s in group['samples'])
+
+            for done, group in enumerate(groups):
                 if worker_instance and worker_instance.cancel_requested():  # Check for cancellation
                     logger.info("Groups export cancelled by user.")
                     return 1  # Return non-zero for cancellation
+                if worker_instance:
+                    worker_instance.report_progress("Exporting groups", done, len(groups))
 
                 group_name = group['group']
                 expansion_name = group['expansion']
                 base_path = group['path']
                 samples = group['samples']
 
-                group_folder = os.path.join(self.output_folder, expansion_name, group_name)
-                os.makedirs(group_folder, exist_ok=True)
+                group_folder = os.path.join(expansion_name, group_name)  # Relative to each profile's output folder
+                for profile in self.profiles:
+                    os.makedirs(os.path.join(profile.output_folder, group_folder), exist_ok=True)
 
                 pad_to_sample = {}
                 for s in samples:
@@ -120,31 +183,28 @@ class GroupsProcessor:
                     suffix = f"{target_pad:02d}_"
 
                     if sample:
-                        if sample['type'] == 'multisample':
-                            source_rel_path = pick_multisample_path(sample['paths'])
-                        else:
-                            source_rel_path = sample['paths']
-
-                        source_path = os.path.join(base_path, source_rel_path)
+                        source_path = get_source_path(base_path, sample)
                         if not os.path.isfile(source_path):
                             logger.warning(f"Source file not found {source_path}")
                             continue
 
                         filename = os.path.basename(source_path)
-                        target_filename = suffix + filename
-                        target_path = os.path.join(group_folder, target_filename)
-
-                        if self.skip_existing and os.path.exists(target_path):
-                            logger.info(f"Skipping existing file: {target_path}")
+                        targets = self.get_targets(group_folder, suffix + filename)
+                        if not targets:
                             continue
 
                         try:
-                            trim_and_normalize_wav(source_path, target_path, self.trim_silence, self.normalize, self.sample_rate, self.bit_depth)
+                            features = converter.convert_targets(source_path, targets, cacheable=source_uses[source_path] > 1)
+                            if feature_db:
+                                feature_db.add(source_path, features)
+                            target_paths = [target_path for target_path, _ in targets]
                         except Exception as e:
                             logger.error(f"Error processing {source_path}: {e}")
-                            shutil.copy2(source_path, target_path)
+                            # Copy keeps the source format
+                            target_paths = self.copy_source(source_path, targets, suffix + filename)
 
-                        logger.info(f"Copied pad {original_pad:02d} -> target pad {target_pad:02d} file: {target_path}")
+                        for target_path in target_paths:
+                            logger.info(f"Copied pad {original_pad:02d} -> target pad {target_pad:02d} file: {target_path}")
                     else:
                         if self.fill_blanks:
                             import random
@@ -158,36 +218,50 @@ class GroupsProcessor:
                             else:
                                 source_path = self.fill_blanks
                             if source_path and os.path.isfile(source_path):
-                                target_filename = suffix + os.path.basename(source_path)
-                                target_path = os.path.join(group_folder, target_filename)
-                                if self.skip_existing and os.path.exists(target_path):
-                                    logger.info(f"Skipping existing file: {target_path}")
+                                filename = os.path.basename(source_path)
+                                targets = self.get_targets(group_folder, suffix + filename)
+                                if not targets:
                                     continue
                                 try:
-                                    trim_and_normalize_wav(source_path, target_path, self.trim_silence, self.normalize, self.sample_rate, self.bit_depth)
+                                    features = converter.convert_targets(source_path, targets)
+                                    if feature_db:
+                                        feature_db.add(source_path, features)
+                                    target_paths = [target_path for target_path, _ in targets]
                                 except Exception as e:
                                     logger.error(f"Error processing {source_path}: {e}")
-                                    shutil.copy2(source_path, target_path)
-                                logger.info(f"Filled blank pad {original_pad:02d} -> target pad {target_pad:02d} with: {target_path}")
+                                    # Copy keeps the source format
+                                    target_paths = self.copy_source(source_path, targets, suffix + filename)
+                                for target_path in target_paths:
+                                    logger.info(f"Filled blank pad {original_pad:02d} -> target pad {target_pad:02d} with: {target_path}")
                             else:
                                 logger.warning(f"No valid file to fill blank pad {original_pad:02d}")
                 if self.include_preview:
                     preview_dir = os.path.join(base_path, "Groups", "groups", ".previews")
                     preview_file = os.path.join(preview_dir, group_name + ".mxgrp.ogg")
                     if os.path.isfile(preview_file):
-                        preview_wav = os.path.join(group_folder, "Preview - " + group_name + ".wav")
-                        if self.skip_existing and os.path.exists(preview_wav):
-                            logger.info(f"Skipping existing preview file: {preview_wav}")
+                        targets = self.get_targets(group_folder, "Preview - " + group_name + ".wav")
+                        if not targets:
                             continue
                         try:
-                            trim_and_normalize_wav(preview_file, preview_wav, self.trim_silence, self.normalize, self.sample_rate, self.bit_depth)
-                            logger.info(f"Included preview sample: {preview_wav}")
+                            features = converter.convert_targets(preview_file, targets, cacheable=False)
+                            if feature_db:
+                                feature_db.add(preview_file, features)
+                            for preview_wav, _ in targets:
+                                logger.info(f"Included preview sample: {preview_wav}")
                         except Exception as e:
                             logger.error(f"Error processing preview {preview_file}: {e}")
+            if worker_instance:
+                worker_instance.report_progress("Exporting groups", len(groups), len(groups))
             return 0
         except Exception as e:
             logger.error(f"Error processing groups: {e}")
             return 1
+        finally:
+            if converter and converter.cache:
+                logger.info(f"Audio cache: {converter.cache.report()}")
+            if feature_db:
+                feature_db.close()
+                logger.info(f"Audio features saved to {self.features_db_path}")
 
 
 def main(
@@ -204,7 +278,12 @@ def main(
     bit_depth: int,
     enable_matrix: bool,
     include_preview: bool,
-    skip_existing: bool
+    skip_existing: bool,
+    output_format: str,
+    compression_level: int,
+    features_db: str,
+    cache_mb: int,
+    profiles: list[OutputProfile]
 ):
     # Matrix
     if matrix_json:
@@ -239,7 +318,12 @@ def main(
         bit_depth=bit_depth,
         enable_matrix=enable_matrix,
         include_preview=include_preview,
-        skip_existing=skip_existing
+        skip_existing=skip_existing,
+        output_format=AudioFormat(output_format.upper()),
+        compression_level=compression_level,
+        features_db_path=features_db,
+        cache_mb=cache_mb,
+        profiles=[OutputProfile(output_folder, sample_rate, bit_depth, AudioFormat(output_format.upper()))] + profiles if profiles else None
     )
     sys.exit(processor.run())
 
@@ -260,6 +344,11 @@ if __name__ == "__main__":
     parser.add_argument("--enable_matrix", action='store_true', help="Enable pad matrix reorder")
     parser.add_argument("--include_preview", action='store_true', help="Include preview samples from groups.previews")
     parser.add_argument("--skip_existing", action='store_true', help="Skip processing if output file already exists")
+    parser.add_argument("--format", choices=["wav", "flac"], default="wav", help="Output audio format (default: wav)")
+    parser.add_argument("--compression_level", type=int, default=5, help=f"FLAC compression level, 0 (fastest) to {MAX_FLAC_COMPRESSION_LEVEL} (smallest) (default: 5)")
+    parser.add_argument("--features_db", help="Store duration, peak, RMS, leading silence, channels and sample rate of every source in this SQLite file")
+    parser.add_argument("--cache_mb", type=int, default=DEFAULT_CACHE_MB, help=f"Memory budget in MB for caching decoded audio of repeated sources, 0 disables it (default: {DEFAULT_CACHE_MB})")
+    add_profile_argument(parser, PROFILE_FORMATS)
 
     args = parser.parse_args()
 
@@ -300,6 +389,24 @@ if __name__ == "__main__":
         logger.error(f"Error: Bit depth must be a positive integer, got {args.bit_depth}.")
         sys.exit(1)
 
+    if args.format == "flac" and args.bit_depth not in (None, 8, 16, 24):
+        logger.error(f"Error: FLAC supports bit depths of 8, 16 or 24, got {args.bit_depth}.")
+        sys.exit(1)
+
+    if not 0 <= args.compression_level <= MAX_FLAC_COMPRESSION_LEVEL:
+        logger.error(f"Error: Compression level must be between 0 and {MAX_FLAC_COMPRESSION_LEVEL}, got {args.compression_level}.")
+        sys.exit(1)
+
+    if args.cache_mb < 0:
+        logger.error(f"Error: Cache size must be zero or a positive integer, got {args.cache_mb}.")
+        sys.exit(1)
+
+    try:
+        profiles = parse_profiles(args.profile, PROFILE_FORMATS)
+    except ValueError as e:
+        logger.error(f"Error: {e}")
+        sys.exit(1)
+
     try:
         main(
             json_path=args.json_path,
@@ -315,7 +422,12 @@ if __name__ == "__main__":
             bit_depth=args.bit_depth,
             enable_matrix=args.enable_matrix,
             include_preview=args.include_preview,
-            skip_existing=args.skip_existing
+            skip_existing=args.skip_existing,
+            output_format=args.format,
+            compression_level=args.compression_level,
+            features_db=args.features_db,
+            cache_mb=args.cache_mb,
+            profiles=profiles
         )
     except SystemExit as e:
         sys.exit(e.code)
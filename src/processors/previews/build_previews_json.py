@@ -1,14 +1,22 @@
 import argparse
 import json
+import os
 import platform  # Added import
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Conditional import for winreg
 if platform.system() == "Windows":
     import winreg
 
+from processors.previews.previews_catalog import (
+    CATALOG_FILENAME, NATIVE_BROWSER_PREVIEW_LIBRARY, PreviewsCatalog,
+    get_content_key, get_wav_name, scan_content_dir)
+from processors.previews.previews_manifest import to_manifest
+from processors.previews.upid_index import resolve_real_instrument
 from utils.constants import LOGS_PATH
+from utils.file_utils import find_duplicate_files, get_drive_id
 from utils.logger import Logger
 
 logger = Logger.get_logger("PreviewsBuilder")
@@ -16,6 +24,9 @@ logger = Logger.get_logger("PreviewsBuilder")
 # Registry path to Native Instruments registry (Windows only)
 REG_PATH = r"SOFTWARE\Native Instruments"
 
+# Content directories scanned at the same time on one drive, more only makes spinning disks seek
+SCANS_PER_DRIVE = 1
+
 
 def get_windows_content_paths():
     """Return all ContentDir values for Native Instruments products from the Windows registry."""
@@ -44,47 +55,74 @@ def get_windows_content_paths():
     return content_paths
 
 
-def get_macos_content_paths():
-    """Return common Native Instruments content directories on macOS."""
-    base_search_paths = [
-        Path("/Users/Shared/Native Instruments"),
-        Path.home() / "Library/Application Support/Native Instruments",
-        Path("/Library/Application Support/Native Instruments"),
-    ]
+def walk_content_tree(base_path: str):
+    """
+    Walk base_path once with scandir, returning the folders holding .nicnt files and the .previews folders.
+    Like rglob, symlinked folders are not descended into.
+    """
+    nicnt_dirs = set()
+    previews_dirs = []
+    pending = [base_path]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name == ".previews":
+                                previews_dirs.append(entry.path)
+                            pending.append(entry.path)
+                        elif entry.name.endswith(".nicnt"):
+                            nicnt_dirs.add(current)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.debug(f"Cannot scan {current}: {e}")
+    return nicnt_dirs, previews_dirs
+
+
+def get_macos_content_paths(base_search_paths=None):
+    """Return common Native Instruments content directories on macOS, or the ones found under base_search_paths."""
+    if base_search_paths is None:
+        base_search_paths = [
+            Path("/Users/Shared/Native Instruments"),
+            Path.home() / "Library/Application Support/Native Instruments",
+            Path("/Library/Application Support/Native Instruments"),
+        ]
+    bases = {str(base_path) for base_path in base_search_paths}
     found_content_dirs = set()
 
-    for base_path in base_search_paths:
-        if base_path.exists() and base_path.is_dir():
-            # Search for .nicnt files (Kontakt libraries) or .previews folders
-            for nicnt_file in base_path.rglob("*.nicnt"):
-                content_dir = nicnt_file.parent
-                if content_dir.is_dir():
-                    found_content_dirs.add(content_dir)
-
-            for previews_folder in base_path.rglob(".previews"):
-                current_path = previews_folder
-                # Traverse up to find the library root
-                while current_path != base_path and current_path.parent != current_path:
-                    # If the parent is one of the base search paths, then current_path is a library root
-                    if current_path.parent in base_search_paths:
-                        found_content_dirs.add(current_path)
-                        break
-                    # If current_path itself contains a .nicnt, it's a library root
-                    if list(current_path.glob("*.nicnt")):
-                        found_content_dirs.add(current_path)
-                        break
-                    current_path = current_path.parent
-                else:  # If loop completes without break, add the highest level found before hitting base_path or root
-                    if current_path != base_path:
-                        found_content_dirs.add(current_path)
-
-    # Convert set of paths to list of (instrument_name, path) tuples
-    result = []
-    for path in found_content_dirs:
-        # Use the folder name as the instrument name
-        instrument_name = path.name
-        result.append((instrument_name, path))
-    return result
+    for base_path in map(str, base_search_paths):
+        if not os.path.isdir(base_path):
+            continue
+        # Kontakt libraries are the folders holding a .nicnt file
+        nicnt_dirs, previews_dirs = walk_content_tree(base_path)
+        found_content_dirs.update(nicnt_dirs)
+
+        # The library root of a .previews folder is its closest ancestor holding a .nicnt, or the folder right
+        # below a base search path. Roots are memoized per folder, so sibling .previews resolve without climbing again.
+        roots = {}
+        for previews_dir in previews_dirs:
+            climbed = []
+            current = previews_dir
+            root = None
+            while current != base_path and os.path.dirname(current) != current:
+                if current in roots:
+                    root = roots[current]
+                    break
+                climbed.append(current)
+                if os.path.dirname(current) in bases or current in nicnt_dirs:
+                    root = current
+                    break
+                current = os.path.dirname(current)
+            for folder in climbed:
+                roots[folder] = root
+            if root:
+                found_content_dirs.add(root)
+
+    # Convert set of paths to list of (instrument_name, path) tuples, using the folder name as the instrument name
+    return [(Path(path).name, Path(path)) for path in sorted(found_content_dirs)]
 
 
 def get_ni_content_paths():
@@ -107,29 +145,30 @@ def collect_samples_from_path(instrument_name: str, content_dir: Path):
     samples = []
     for folder in content_dir.rglob(".previews"):
         if folder.is_dir():
+            # Previews of the Native Browser Preview Library are filed by product UPID, resolved once per folder
+            real_instrument = resolve_real_instrument(folder) if instrument_name == NATIVE_BROWSER_PREVIEW_LIBRARY else None
             for ogg_file in folder.glob("*.ogg"):
-                # Remove specific extensions from the filename if present
-                filename = ogg_file.stem
-                extensions_to_strip = {".nkm", ".nabs", ".nkl", ".mxinst", ".nkt", ".nrkt", ".nbkt", ".nksf", ".nksn", ".nki", ".nkbt", ".nfm8", ".mxsnd", ".nmsv", ".mxgrp", ".nksr"}
-
-                for ext in extensions_to_strip:
-                    if filename.lower().endswith(ext):
-                        filename = filename[: -len(ext)]
-                        break  # Stop after removing the first matching extension
-
-                samples.append({
+                sample = {
                     "instrument": instrument_name,
                     "ogg_path": str(ogg_file),
-                    "wav_name": f"{filename}.wav",
-                })
+                    "wav_name": get_wav_name(ogg_file.name),
+                }
+                if real_instrument:
+                    sample["real_instrument"] = real_instrument
+                samples.append(sample)
     return samples
 
 
 class PreviewsJsonBuilder:
-    def __init__(self, output_folder: str):
+    def __init__(self, output_folder: str, scans_per_drive: int = SCANS_PER_DRIVE, use_catalog: bool = False, compact: bool = False, dedupe: bool = True):
         self.output_folder = output_folder
+        self.scans_per_drive = scans_per_drive
+        self.use_catalog = use_catalog  # Update previews.db incrementally instead of writing all_previews.json
+        self.compact = compact  # Write all_previews.json as a columnar manifest with string tables
+        self.dedupe = dedupe  # Mark previews found more than once, so they are only converted once
 
     def run(self, worker_instance=None):
+        catalog = None
         try:
             output_path = Path(self.output_folder)
             output_path.mkdir(exist_ok=True)
@@ -139,34 +178,117 @@ class PreviewsJsonBuilder:
             # Get content paths based on OS
             ni_content_paths = get_ni_content_paths()
 
-            for inst_name, content_dir_path in ni_content_paths:
+            if self.use_catalog:
+                catalog = PreviewsCatalog(str(output_path / CATALOG_FILENAME))
+                # The catalog is keyed by content directory, so one listed under several names is scanned for the first one
+                content_keys = set()
+                unique_content_paths = []
+                for inst_name, content_dir_path in ni_content_paths:
+                    content_key = get_content_key(content_dir_path)
+                    if content_key in content_keys:
+                        logger.warning(f"Skipping {inst_name}, its content directory {content_dir_path} is already scanned for another instrument")
+                        continue
+                    content_keys.add(content_key)
+                    unique_content_paths.append((inst_name, content_dir_path))
+                ni_content_paths = unique_content_paths
+
+            def scan(inst_name, content_dir_path, known_folders):
                 if worker_instance and worker_instance.cancel_requested():
-                    logger.info("Previews JSON build cancelled by user.")
-                    return 1  # Return non-zero for cancellation
-
+                    return None
                 logger.info(f"Collecting samples for: {inst_name} from {content_dir_path}")
-                all_samples.extend(collect_samples_from_path(inst_name, content_dir_path))
+                if catalog:
+                    return scan_content_dir(inst_name, content_dir_path, known_folders)
+                return collect_samples_from_path(inst_name, content_dir_path)
+
+            # Libraries on different drives are scanned concurrently, each drive with its own small pool
+            drive_pools = {}
+            futures = []
+            try:
+                for inst_name, content_dir_path in ni_content_paths:
+                    drive = get_drive_id(content_dir_path)
+                    if drive not in drive_pools:
+                        drive_pools[drive] = ThreadPoolExecutor(max_workers=self.scans_per_drive, thread_name_prefix="PreviewsScan")
+                    known_folders = catalog.known_folders(content_dir_path) if catalog else None  # Read here, the connection stays on this thread
+                    futures.append(drive_pools[drive].submit(scan, inst_name, content_dir_path, known_folders))
+
+                # Merged in submission order, so the JSON does not depend on which drive finishes first
+                for done, ((inst_name, _), future) in enumerate(zip(ni_content_paths, futures)):
+                    if worker_instance:
+                        worker_instance.report_progress("Scanning libraries", done, len(futures))
+                    result = future.result()
+                    if result is None:
+                        continue
+                    if catalog:
+                        catalog.apply(result)
+                        logger.info(f"{inst_name} ({result.content_dir}): {len(result.previews)} changed .previews folders, {len(result.removed_folders)} removed folders")
+                    else:
+                        all_samples.extend(result)
+                if worker_instance:
+                    worker_instance.report_progress("Scanning libraries", len(futures), len(futures))
+            finally:
+                for pool in drive_pools.values():
+                    pool.shutdown(cancel_futures=True)
+
+            if worker_instance and worker_instance.cancel_requested():
+                logger.info("Previews JSON build cancelled by user.")
+                return 1  # Return non-zero for cancellation
+
+            if catalog:
+                catalog.retain_content_dirs([content_dir_path for _, content_dir_path in ni_content_paths])
+                if self.dedupe:
+                    duplicates = catalog.mark_duplicates()
+                    if duplicates:
+                        logger.info(f"Found {duplicates} duplicate previews, {catalog.count() - duplicates} will be converted")
+                else:
+                    catalog.clear_duplicates()
+                logger.info(f"Catalog {catalog.db_path} holds {catalog.count()} samples")
+                return 0  # Success
+
+            if self.dedupe:
+                self.mark_duplicates(all_samples)
 
             # Save to JSON
             output_json_path = output_path / "all_previews.json"
             with open(output_json_path, "w", encoding="utf-8") as f:
-                json.dump(all_samples, f, indent=4)
+                if self.compact:
+                    json.dump(to_manifest(all_samples), f, separators=(",", ":"))
+                else:
+                    json.dump(all_samples, f, indent=4)
 
             logger.info(f"Exported {len(all_samples)} samples to {output_json_path}")
             return 0  # Success
         except Exception as e:
             logger.error(f"Error building previews JSON: {e}")
             return 1  # Error
-
-
-def main(output_folder: str):
-    builder = PreviewsJsonBuilder(output_folder=output_folder)
+        finally:
+            if catalog:
+                catalog.close()
+
+    @staticmethod
+    def mark_duplicates(samples: list[dict]):
+        """
+        The same preview is often found in its instrument folder and again in the Native Browser Preview Library,
+        or twice through symlinked content folders. Point every repeated one to the first sample with its content.
+        """
+        duplicates = find_duplicate_files([sample["ogg_path"] for sample in samples])
+        for index, original in duplicates.items():
+            samples[index]["duplicate_of"] = samples[original]["ogg_path"]
+        if duplicates:
+            logger.info(f"Found {len(duplicates)} duplicate previews, {len(samples) - len(duplicates)} will be converted")
+
+
+def main(output_folder: str, scans_per_drive: int, use_catalog: bool, compact: bool, dedupe: bool):
+    builder = PreviewsJsonBuilder(output_folder=output_folder, scans_per_drive=scans_per_drive, use_catalog=use_catalog, compact=compact, dedupe=dedupe)
     sys.exit(builder.run())
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Builds a JSON file of Native Instruments previews.")
     parser.add_argument("output_folder", help="Path to the output folder where the JSON will be saved.")
+    parser.add_argument("--catalog", action="store_true", help=f"Update the {CATALOG_FILENAME} SQLite catalog incrementally, rescanning only changed folders, instead of writing all_previews.json")
+    parser.add_argument("--compact", action="store_true", help="Write all_previews.json as a compact manifest that stores instrument names and folders once")
+    parser.add_argument("--keep_duplicates", action="store_true", help="Do not look for previews found more than once (by inode, then by content), which are otherwise converted once and copied")
+    parser.add_argument("--scans_per_drive", type=int, default=SCANS_PER_DRIVE, help=f"Content directories scanned concurrently on each drive (default: {SCANS_PER_DRIVE})")
     args = parser.parse_args()
 
     # Parameter Validation
@@ -177,7 +299,11 @@ if __name__ == "__main__":
         logger.error(f"Error: Could not create output folder '{args.output_folder}': {e}")
         sys.exit(1)
 
+    if args.scans_per_drive <= 0:
+        logger.error(f"Error: Scans per drive must be a positive integer, got {args.scans_per_drive}.")
+        sys.exit(1)
+
     try:
-        main(output_folder=args.output_folder)
+        main(output_folder=args.output_folder, scans_per_drive=args.scans_per_drive, use_catalog=args.catalog, compact=args.compact, dedupe=not args.keep_duplicates)
     except SystemExit as e:
         sys.exit(e.code)
@@ -0,0 +1,243 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from processors.previews.upid_index import resolve_real_instrument
+from utils.file_utils import find_duplicate_files
+
+CATALOG_FILENAME = "previews.db"
+NATIVE_BROWSER_PREVIEW_LIBRARY = "Native Browser Preview Library"
+PREVIEW_EXTENSIONS = {".nkm", ".nabs", ".nkl", ".mxinst", ".nkt", ".nrkt", ".nbkt", ".nksf", ".nksn", ".nki", ".nkbt", ".nfm8", ".mxsnd", ".nmsv", ".mxgrp", ".nksr"}
+
+
+def get_wav_name(ogg_name: str) -> str:
+    """Return the exported file name of a preview, removing the NI extension of the previewed file if present."""
+    filename = ogg_name[:-len(".ogg")] if ogg_name.lower().endswith(".ogg") else ogg_name
+    stem, dot, ext = filename.rpartition(".")
+    if dot and f".{ext.lower()}" in PREVIEW_EXTENSIONS:
+        filename = stem  # Every extension is a single suffix, so only the last one can match
+    return f"{filename}.wav"
+
+
+def is_catalog(path: str) -> bool:
+    return path.lower().endswith(".db")
+
+
+def get_content_key(content_dir: str | Path) -> str:
+    """Return the key of a content directory in the catalog, its absolute path. Instrument names are not unique on macOS."""
+    return os.path.abspath(content_dir)
+
+
+class CatalogScan(NamedTuple):
+    """Changes found by scan_content_dir, to be stored with PreviewsCatalog.apply."""
+    content_dir: str  # Key of the scanned content directory, from get_content_key
+    instrument: str
+    folders: dict[str, tuple[int, list[str]]]  # New or modified folders, with their mtime and subfolder names
+    removed_folders: list[str]
+    previews: dict[str, list[tuple]]  # Rows of every rescanned .previews folder
+
+
+def scan_content_dir(instrument: str, content_dir: Path, known_folders: dict[str, tuple[int, list[str]]]) -> CatalogScan:
+    """
+    Walk a content directory, listing only the folders whose mtime changed since the previous scan.
+    Unchanged folders are descended into through their stored subfolder names. Adding, removing or
+    renaming a preview changes the mtime of its .previews folder, so that is the only one read again.
+    Does not touch the database, so several content directories can be scanned from different threads.
+    """
+    content_key = get_content_key(content_dir)
+    folders = {}
+    previews = {}
+    visited = set()
+    pending = [str(content_dir)]
+    while pending:
+        folder = pending.pop()
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            continue
+        visited.add(folder)
+
+        cached = known_folders.get(folder)
+        if cached and cached[0] == mtime:
+            subfolders = cached[1]
+        else:
+            subfolders = []
+            oggs = []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subfolders.append(entry.name)
+                        elif entry.name.lower().endswith(".ogg"):
+                            oggs.append(entry)
+            except OSError:
+                continue
+            folders[folder] = (mtime, subfolders)
+            if os.path.basename(folder) == ".previews":
+                real_instrument = resolve_real_instrument(folder) if instrument == NATIVE_BROWSER_PREVIEW_LIBRARY else None
+                previews[folder] = [_preview_row(content_key, instrument, folder, entry, real_instrument) for entry in oggs]
+        pending.extend(os.path.join(folder, name) for name in subfolders)
+
+    return CatalogScan(content_key, instrument, folders, [folder for folder in known_folders if folder not in visited], previews)
+
+
+def _preview_row(content_key: str, instrument: str, folder: str, entry: os.DirEntry, real_instrument: str | None) -> tuple:
+    stat = entry.stat()
+    name = entry.name.lower()
+    return (content_key, instrument, entry.path, folder, get_wav_name(entry.name), stat.st_size, stat.st_mtime_ns,
+            real_instrument, name.endswith(".mxgrp.ogg"), name.endswith(".nbkt.ogg"))
+
+
+class PreviewsCatalog:
+    """
+    SQLite catalog of the previews of every content directory, updated incrementally by the previews builder
+    and queried by the previews processor with indexed filters instead of loading a JSON list.
+    Rows are keyed by the absolute path of their content directory, the instrument name is only stored.
+    Previews found more than once point to the first one in duplicate_of, like in all_previews.json.
+    """
+
+    PREVIEW_COLUMNS = ("content_dir", "instrument", "ogg_path", "folder", "wav_name", "size", "mtime_ns", "real_instrument", "maschine_group", "battery_kit")
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection = sqlite3.connect(db_path)
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(folders)")}
+        if columns and "content_dir" not in columns:
+            # Catalogs of older versions were keyed by instrument name, they are scanned again from scratch
+            self._connection.executescript("DROP TABLE folders; DROP TABLE IF EXISTS previews; DROP TABLE IF EXISTS meta;")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS folders (
+                content_dir TEXT NOT NULL,
+                path TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                subfolders TEXT NOT NULL,
+                PRIMARY KEY (content_dir, path)
+            );
+            CREATE TABLE IF NOT EXISTS previews (
+                content_dir TEXT NOT NULL,
+                instrument TEXT NOT NULL,
+                ogg_path TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                wav_name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                real_instrument TEXT,
+                maschine_group INTEGER NOT NULL,
+                battery_kit INTEGER NOT NULL,
+                duplicate_of TEXT,
+                PRIMARY KEY (content_dir, ogg_path)
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_previews_folder ON previews (content_dir, folder);
+            CREATE INDEX IF NOT EXISTS idx_previews_kind ON previews (maschine_group, battery_kit);
+            CREATE INDEX IF NOT EXISTS idx_previews_duplicate_of ON previews (duplicate_of);
+        """)
+
+    def known_folders(self, content_dir: str | Path) -> dict[str, tuple[int, list[str]]]:
+        rows = self._connection.execute("SELECT path, mtime_ns, subfolders FROM folders WHERE content_dir = ?", (get_content_key(content_dir),))
+        return {path: (mtime_ns, json.loads(subfolders)) for path, mtime_ns, subfolders in rows}
+
+    def apply(self, scan: CatalogScan):
+        """Store the changes of a scan_content_dir call in a single transaction."""
+        with self._connection:
+            # Unchanged folders are not read again, so a content directory listed under a new name is renamed here
+            renamed = self._connection.execute("UPDATE previews SET instrument = ? WHERE content_dir = ? AND instrument <> ?",
+                                               (scan.instrument, scan.content_dir, scan.instrument)).rowcount
+            if scan.previews or scan.removed_folders or renamed:
+                self._set_duplicates_marked(False)
+            gone = [(scan.content_dir, folder) for folder in scan.removed_folders]
+            self._connection.executemany("DELETE FROM folders WHERE content_dir = ? AND path = ?", gone)
+            self._connection.executemany("DELETE FROM previews WHERE content_dir = ? AND folder = ?", gone + [(scan.content_dir, folder) for folder in scan.previews])
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?)",
+                ((scan.content_dir, folder, mtime, json.dumps(subfolders)) for folder, (mtime, subfolders) in scan.folders.items()),
+            )
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO previews ({', '.join(self.PREVIEW_COLUMNS)}) VALUES ({', '.join('?' * len(self.PREVIEW_COLUMNS))})",
+                (row for rows in scan.previews.values() for row in rows),
+            )
+
+    def retain_content_dirs(self, content_dirs: list[str | Path]):
+        """Forget the content directories that are no longer installed."""
+        content_keys = [get_content_key(content_dir) for content_dir in content_dirs]
+        placeholders = ", ".join("?" * len(content_keys))
+        with self._connection:
+            self._connection.execute(f"DELETE FROM folders WHERE content_dir NOT IN ({placeholders})", content_keys)
+            if self._connection.execute(f"DELETE FROM previews WHERE content_dir NOT IN ({placeholders})", content_keys).rowcount:
+                self._set_duplicates_marked(False)
+
+    def mark_duplicates(self) -> int:
+        """
+        Point every preview whose content appeared earlier in query order to that first one, with find_duplicate_files.
+        Only done again when a scan changed the previews since the last time. Returns the number of duplicates.
+        """
+        if self._get_meta("duplicates_marked") != "1":
+            rows = self._connection.execute("SELECT content_dir, ogg_path FROM previews ORDER BY instrument, content_dir, ogg_path").fetchall()
+            duplicates = find_duplicate_files([ogg_path for _, ogg_path in rows])
+            with self._connection:
+                self._connection.execute("UPDATE previews SET duplicate_of = NULL WHERE duplicate_of IS NOT NULL")
+                self._connection.executemany("UPDATE previews SET duplicate_of = ? WHERE content_dir = ? AND ogg_path = ?",
+                                             ((rows[original][1], *rows[index]) for index, original in duplicates.items()))
+                self._set_duplicates_marked(True)
+        return self._connection.execute("SELECT COUNT(*) FROM previews WHERE duplicate_of IS NOT NULL").fetchone()[0]
+
+    def clear_duplicates(self):
+        """Forget the duplicates, so every preview is converted."""
+        with self._connection:
+            self._connection.execute("UPDATE previews SET duplicate_of = NULL WHERE duplicate_of IS NOT NULL")
+            self._set_duplicates_marked(False)
+
+    def _get_meta(self, key: str) -> str | None:
+        row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_duplicates_marked(self, marked: bool):
+        self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('duplicates_marked', ?)", ("1" if marked else "0",))
+
+    def count(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM previews").fetchone()[0]
+
+    @staticmethod
+    def _skip_rules(skip_maschine_groups, skip_battery_kits, skip_native_browser_preview_library) -> list[tuple[str, str, tuple]]:
+        """Return the (name, condition matching the previews it skips, parameters) of every enabled skip option."""
+        rules = []
+        if skip_maschine_groups:
+            rules.append(("Maschine group", "maschine_group = 1", ()))
+        if skip_battery_kits:
+            rules.append(("Battery kit", "battery_kit = 1", ()))
+        if skip_native_browser_preview_library:
+            rules.append((NATIVE_BROWSER_PREVIEW_LIBRARY, "instrument = ?", (NATIVE_BROWSER_PREVIEW_LIBRARY,)))
+        return rules
+
+    def skip_counts(self, skip_maschine_groups=False, skip_battery_kits=False, skip_native_browser_preview_library=False) -> dict[str, int]:
+        """Return the number of previews matched by each enabled skip option, by the name of the option."""
+        return {name: self._connection.execute(f"SELECT COUNT(*) FROM previews WHERE {condition}", parameters).fetchone()[0]
+                for name, condition, parameters in self._skip_rules(skip_maschine_groups, skip_battery_kits, skip_native_browser_preview_library)}
+
+    def query(self, skip_maschine_groups=False, skip_battery_kits=False, skip_native_browser_preview_library=False,
+              find_real_instrument_folder=False) -> Iterator[tuple[str, str, str, str | None]]:
+        """
+        Yield the (ogg_path, wav_name, instrument, source_key) of the previews to export, streaming them from the database.
+        source_key is the ogg_path of the original for previews found more than once, and None for unique ones.
+        """
+        conditions = ["1"]
+        parameters = []
+        for _, condition, rule_parameters in self._skip_rules(skip_maschine_groups, skip_battery_kits, skip_native_browser_preview_library):
+            conditions.append(f"NOT ({condition})")
+            parameters.extend(rule_parameters)
+        instrument = "COALESCE(real_instrument, instrument)" if find_real_instrument_folder else "instrument"
+        yield from self._connection.execute(
+            f"SELECT ogg_path, wav_name, {instrument}, "
+            "COALESCE(duplicate_of, CASE WHEN ogg_path IN (SELECT duplicate_of FROM previews) THEN ogg_path END) "
+            f"FROM previews WHERE {' AND '.join(conditions)} ORDER BY instrument, content_dir, ogg_path",
+            parameters,
+        )
+
+    def close(self):
+        self._connection.close()
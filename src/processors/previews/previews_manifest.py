@@ -0,0 +1,86 @@
+import os
+from typing import Iterator
+
+from processors.previews.previews_catalog import get_wav_name
+
+MANIFEST_VERSION = 1
+
+
+def is_manifest(data) -> bool:
+    """Tell a compact manifest apart from the list of entries of a verbose all_previews.json."""
+    return isinstance(data, dict) and "manifest_version" in data
+
+
+def to_manifest(samples: list[dict]) -> dict:
+    """
+    Pack the entries of all_previews.json into columns that reference string tables of instruments
+    and folder prefixes, so each preview only stores two indices and its file name.
+    Wav names are not stored, they are derived from the file names when loading.
+    Samples marked with duplicate_of are grouped in alternates, each group starting with the original.
+    Resolved real instruments are stored per folder, as an index in the instruments table.
+    """
+    instruments: dict[str, int] = {}
+    folders: dict[str, int] = {}
+    real_instruments: dict[int, int] = {}
+    instrument_column = []
+    folder_column = []
+    name_column = []
+    for sample in samples:
+        ogg_path = sample["ogg_path"]
+        name = os.path.basename(ogg_path)
+        prefix = ogg_path[:len(ogg_path) - len(name)]  # Keeps the trailing separator, so loading is a concatenation
+        instrument_column.append(instruments.setdefault(sample["instrument"], len(instruments)))
+        folder = folders.setdefault(prefix, len(folders))
+        folder_column.append(folder)
+        name_column.append(name)
+        if "real_instrument" in sample:
+            real_instruments[folder] = instruments.setdefault(sample["real_instrument"], len(instruments))
+
+    originals = {sample["duplicate_of"] for sample in samples if "duplicate_of" in sample}
+    alternates: dict[str, list[int]] = {}
+    if originals:
+        for index, sample in enumerate(samples):
+            if sample["ogg_path"] in originals:
+                alternates.setdefault(sample["ogg_path"], []).insert(0, index)
+            elif "duplicate_of" in sample:
+                alternates.setdefault(sample["duplicate_of"], []).append(index)
+    return {
+        "manifest_version": MANIFEST_VERSION,
+        "instruments": list(instruments),
+        "folders": list(folders),
+        "real_instruments": [real_instruments.get(folder) for folder in range(len(folders))],
+        "instrument": instrument_column,
+        "folder": folder_column,
+        "name": name_column,
+        "alternates": list(alternates.values()),
+    }
+
+
+def manifest_len(manifest: dict) -> int:
+    return len(manifest["name"])
+
+
+def iter_manifest(manifest: dict) -> Iterator[tuple[str, str, str, str | None, str]]:
+    """
+    Yield the (ogg_path, wav_name, instrument, real_instrument, source_path) of every preview, reading the columns directly.
+    source_path is the ogg_path of the original for alternates, and ogg_path itself otherwise.
+    """
+    if manifest["manifest_version"] > MANIFEST_VERSION:
+        raise ValueError(f"Unsupported previews manifest version {manifest['manifest_version']}")
+    instruments = manifest["instruments"]
+    folders = manifest["folders"]
+    real_instruments = [None if index is None else instruments[index] for index in manifest.get("real_instruments", [None] * len(folders))]
+    folder_column = manifest["folder"]
+    name_column = manifest["name"]
+    original_of = {index: group[0] for group in manifest.get("alternates", []) for index in group[1:]}
+    for index, (instrument, folder, name) in enumerate(zip(manifest["instrument"], folder_column, name_column)):
+        ogg_path = folders[folder] + name
+        original = original_of.get(index)
+        source_path = ogg_path if original is None else folders[folder_column[original]] + name_column[original]
+        yield ogg_path, get_wav_name(name), instruments[instrument], real_instruments[folder], source_path
+
+
+def manifest_originals(manifest: dict) -> set[str]:
+    """Return the ogg_path of every preview that has alternates."""
+    folders = manifest["folders"]
+    return {folders[manifest["folder"][group[0]]] + manifest["name"][group[0]] for group in manifest.get("alternates", [])}
@@ -1,14 +1,39 @@
 import argparse
 import json
+import logging
+import os
+import shutil
 import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import NamedTuple
 
-from utils.audio_utils import trim_and_normalize_wav
-from utils.bundle_utils import get_bundled_path
+from processors.previews.previews_catalog import (
+    NATIVE_BROWSER_PREVIEW_LIBRARY, PreviewsCatalog, is_catalog)
+from processors.previews.previews_manifest import (is_manifest,
+                                                   iter_manifest,
+                                                   manifest_originals)
+from utils.audio_utils import (DEFAULT_WORKERS, MAX_FLAC_COMPRESSION_LEVEL,
+                               OutputProfile, add_profile_argument,
+                               output_filename, parse_profiles)
+from utils.enums import AudioFormat
 from utils.logger import Logger
 
 logger = Logger.get_logger("PreviewsProcessor")
 
+PROFILE_FORMATS = (AudioFormat.WAV, AudioFormat.FLAC, AudioFormat.OGG)
+
+
+class SampleResult(NamedTuple):
+    """Outcome of exporting one preview on the pool, logged and stored by the main thread in submission order."""
+    messages: list[tuple[int, str]]
+    outputs: dict[int, str]  # Files converted from this preview, by profile index
+    features: object | None
+    size: int = 0  # Bytes of the preview, for the progress throughput
+
+
 class PreviewsProcessor:
     def __init__(
         self,
@@ -23,6 +48,12 @@ class PreviewsProcessor:
         find_real_instrument_folder=False,
         skip_maschine_folders=False,
         skip_battery_kits=False,
+        output_format=AudioFormat.WAV,
+        compression_level=5,
+        features_db_path=None,
+        profiles=None,
+        workers=DEFAULT_WORKERS,
+        link_pass_through=False,
     ):
         self.json_path = json_path
         self.output_folder = output_folder
@@ -35,79 +66,285 @@ class PreviewsProcessor:
         self.skip_battery_kits = skip_battery_kits
         self.skip_native_browser_preview_library = skip_native_browser_preview_library
         self.find_real_instrument_folder = find_real_instrument_folder
-        self.upids = {}
+        self.output_format = AudioFormat(output_format)
+        self.compression_level = compression_level
+        self.features_db_path = features_db_path
+        self.workers = workers
+        self.link_pass_through = link_pass_through  # Hard link the previews exported as OGG instead of copying them
+        # Every preview is decoded once and written to each profile, the first one being the main output
+        self.profiles = profiles or [OutputProfile(output_folder, sample_rate, bit_depth, self.output_format)]
         self.folders_with_mxgrp_cache = {}
 
+    def load_json_samples(self) -> list[tuple]:
+        """
+        Return the (ogg_path, wav_name, instrument_folder, source_key) of an all_previews.json file or manifest that pass the skip options.
+        source_key is the path of the original for previews found more than once by the builder, and None for unique ones.
+        """
+        with open(self.json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if is_manifest(data):
+            originals = manifest_originals(data)
+            samples = list(iter_manifest(data))
+        else:
+            originals = {sample["duplicate_of"] for sample in data if "duplicate_of" in sample}
+            samples = [(sample["ogg_path"], sample["wav_name"], sample["instrument"], sample.get("real_instrument"), sample.get("duplicate_of", sample["ogg_path"])) for sample in data]
+        del data
+
+        samples = self.partition_samples(samples)
+
+        work = []
+        unresolved = 0
+        for ogg_path, wav_name, instrument_folder, real_instrument, source_path in samples:
+            source_key = source_path if source_path != ogg_path or ogg_path in originals else None
+            if self.find_real_instrument_folder and instrument_folder == NATIVE_BROWSER_PREVIEW_LIBRARY:
+                # Resolved from the UPID of the preview folder by the builder
+                if real_instrument:
+                    instrument_folder = real_instrument
+                else:
+                    unresolved += 1
+            work.append((Path(ogg_path), wav_name, instrument_folder, source_key))
+
+        if unresolved:
+            logger.warning(f"Cannot find the real instrument folder of {unresolved} previews, exported to '{NATIVE_BROWSER_PREVIEW_LIBRARY}'. Build the JSON again if it predates this version.")
+        return work
+
+    def partition_samples(self, samples: list[tuple]) -> list[tuple]:
+        """
+        Drop the samples matched by the enabled skip options before any conversion work, one set of indices per rule.
+        Logs a count per rule, the skipped files are only listed at debug level.
+        """
+        matches = {}
+        if self.skip_maschine_folders:
+            matches["Maschine group"] = {i for i, sample in enumerate(samples) if sample[0].endswith(".mxgrp.ogg")}
+        if self.skip_battery_kits:
+            matches["Battery kit"] = {i for i, sample in enumerate(samples) if sample[0].endswith(".nbkt.ogg")}
+        if self.skip_native_browser_preview_library:
+            matches[NATIVE_BROWSER_PREVIEW_LIBRARY] = {i for i, sample in enumerate(samples) if sample[2] == NATIVE_BROWSER_PREVIEW_LIBRARY}
+        if not matches:
+            return samples
+
+        if logger.isEnabledFor(logging.DEBUG):
+            for rule, indices in matches.items():
+                for i in sorted(indices):
+                    logger.debug(f"Skipping {rule} preview: {samples[i][0]}")
+        skipped = set().union(*matches.values())
+        self.log_skip_counts({rule: len(indices) for rule, indices in matches.items()}, len(samples) - len(skipped), len(samples))
+        return [sample for i, sample in enumerate(samples) if i not in skipped]
+
+    @staticmethod
+    def log_skip_counts(counts: dict[str, int], left: int, total: int):
+        """Log how many previews each skip option matched, a preview can be matched by more than one."""
+        for rule, count in counts.items():
+            logger.info(f"Skipping {count} {rule} previews")
+        logger.info(f"{left} of {total} previews left to export")
+
+    def prepare_output_dirs(self, instrument_folders: set[str]) -> dict[tuple[int, str], tuple[str, set[str] | None]]:
+        """
+        Create the folder of every instrument for every profile, keyed by (profile index, instrument folder).
+        With skip_existing, each folder is listed once here instead of checking every output file.
+        """
+        output_dirs = {}
+        for index, profile in enumerate(self.profiles):
+            for instrument_folder in instrument_folders:
+                folder = str(Path(profile.output_folder) / instrument_folder)
+                os.makedirs(folder, exist_ok=True)
+                output_dirs[index, instrument_folder] = (folder, set(os.listdir(folder)) if self.skip_existing else None)
+        return output_dirs
+
+    @staticmethod
+    def replace_file(source_path, output_path: str, link=False):
+        """
+        Copy or hard link source_path to output_path, removing output_path first. An earlier export with link_pass_through
+        may have left it as a hard link to a library preview, which copying into it would overwrite.
+        """
+        if os.path.lexists(output_path):
+            os.remove(output_path)
+        if link:
+            os.link(source_path, output_path)
+        else:
+            shutil.copyfile(source_path, output_path)
+
+    def pass_through(self, ogg_path: Path, output_path: str) -> str:
+        """Copy the original preview to output_path, or hard link it when link_pass_through is set and possible."""
+        if self.link_pass_through:
+            try:
+                self.replace_file(ogg_path, output_path, link=True)
+                return "Linked"
+            except OSError:
+                pass  # Different drive or no hard link support, copy it instead
+        self.replace_file(ogg_path, output_path)
+        return "Copied"
+
+    def export_sample(self, converter, ogg_path: Path, targets: list[tuple], original: Future | None = None, earlier: set[Future] = frozenset(), worker_instance=None) -> SampleResult:
+        """
+        Convert a preview to its targets, runs on the export pool. Duplicates copy the files converted from their
+        original instead. The original was submitted earlier, so it is already running or done when this waits for it.
+        The same goes for the earlier previews in earlier, which write to some of the same output paths: waiting for
+        them means the files are never written by two threads at once and the last preview wins, as in a sequential export.
+        OGG targets get the original preview file, without decoding it.
+        """
+        messages = []
+        if worker_instance and worker_instance.cancel_requested():
+            return SampleResult(messages, {}, None)
+        for future in earlier:
+            future.result()
+        original_outputs, features = {}, None
+        if original:
+            original_result = original.result()
+            original_outputs, features = original_result.outputs, original_result.features
+        try:
+            size = os.path.getsize(ogg_path)
+            to_convert = []
+            for index, wav_path, settings in targets:
+                if settings.format == AudioFormat.OGG:
+                    action = self.pass_through(ogg_path, wav_path)
+                    messages.append((logging.INFO, f"{action} {ogg_path} -> {wav_path}"))
+                    continue
+                converted_path = original_outputs.get(index)
+                if converted_path is None:
+                    to_convert.append((index, wav_path, settings))
+                elif converted_path != wav_path:
+                    self.replace_file(converted_path, wav_path)
+                    messages.append((logging.INFO, f"Copied duplicate {ogg_path} -> {wav_path}"))
+            outputs = {}
+            if to_convert:
+                features = converter.convert_targets(str(ogg_path), [(wav_path, settings) for _, wav_path, settings in to_convert])
+                for index, wav_path, _ in to_convert:
+                    outputs[index] = wav_path
+                    messages.append((logging.INFO, f"Converted {ogg_path} -> {wav_path}"))
+            return SampleResult(messages, outputs, features, size)
+        except Exception as e:
+            messages.append((logging.ERROR, f"Failed to convert {ogg_path}: {e}"))
+            return SampleResult(messages, {}, None)
+
     def run(self, worker_instance=None):
+        # Imported here, so the command line parses its arguments (e.g. --help) without loading numpy and libsndfile
+        from utils.audio_converter import Converter
+        from utils.feature_utils import FeatureDatabase
+        feature_db = None
+        catalog = None
+        pool = None
         try:
-            if self.find_real_instrument_folder:
-                with open(get_bundled_path("resources/upids.json"), "r", encoding="utf-8") as f:
-                    self.upids = json.load(f)
+            if self.features_db_path:
+                feature_db = FeatureDatabase(self.features_db_path)
+            # Every export thread reuses the buffers of its own converter. Nothing is cached: every source is decoded once,
+            # the duplicates found by the builder copy the files converted from their original
+            converters = threading.local()
+
+            def convert(ogg_path, targets, original, earlier):
+                if not hasattr(converters, "converter"):
+                    converters.converter = Converter(collect_features=feature_db is not None)
+                return self.export_sample(converters.converter, ogg_path, targets, original, earlier, worker_instance)
+
+            profile_settings = [profile.settings(self.trim_silence, self.normalize, self.compression_level) for profile in self.profiles]
+
+            if is_catalog(self.json_path):
+                # The skip options and the real instrument folders are resolved by the catalog query
+                catalog = PreviewsCatalog(self.json_path)
+                skip_options = dict(
+                    skip_maschine_groups=self.skip_maschine_folders,
+                    skip_battery_kits=self.skip_battery_kits,
+                    skip_native_browser_preview_library=self.skip_native_browser_preview_library,
+                )
+                samples = [(Path(ogg_path), wav_name, instrument_folder, source_key) for ogg_path, wav_name, instrument_folder, source_key in catalog.query(
+                    **skip_options, find_real_instrument_folder=self.find_real_instrument_folder)]
+                skip_counts = catalog.skip_counts(**skip_options)
+                if skip_counts:
+                    self.log_skip_counts(skip_counts, len(samples), catalog.count())
+            else:
+                samples = self.load_json_samples()
 
-            with open(self.json_path, "r", encoding="utf-8") as f:
-                samples = json.load(f)
+            # Every output folder is created once up front, so the loop below makes no directory syscalls
+            output_dirs = self.prepare_output_dirs({instrument_folder for _, _, instrument_folder, _ in samples})
 
-            for sample in samples:
+            # libsndfile and numpy release the GIL while decoding, processing and encoding, so threads scale
+            pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="PreviewsExport")
+            pending = deque()  # Submitted previews, finished in order so the log reads as a sequential export
+            originals = {}  # First submitted preview of each source_key, the others copy its files
+            writers = {}  # Last submitted preview writing each output path, until it is finished
+            existing = 0
+            progress = [0, 0]  # Previews done and their bytes
+            total = len(samples)
+
+            def report_progress():
+                if worker_instance:
+                    worker_instance.report_progress("Exporting previews", progress[0], total, progress[1])
+
+            def finish_oldest():
+                ogg_path, future, output_paths = pending.popleft()
+                result = future.result()
+                for output_path in output_paths:
+                    if writers.get(output_path) is future:
+                        del writers[output_path]
+                progress[0] += 1
+                progress[1] += result.size
+                report_progress()
+                for level, message in result.messages:
+                    logger.log(level, message)
+                if feature_db and result.features is not None:
+                    feature_db.add(str(ogg_path), result.features)
+
+            report_progress()
+            for ogg_path, wav_name, instrument_folder, source_key in samples:
                 if worker_instance and worker_instance.cancel_requested():
                     logger.info("Previews export cancelled by user.")
                     return 1  # Return non-zero for cancellation
 
-                ogg_path = Path(sample["ogg_path"])
-                wav_name = sample["wav_name"]
-                instrument_folder = sample["instrument"]
+                targets = []
+                for index, (profile, settings) in enumerate(zip(self.profiles, profile_settings)):
+                    folder, existing_files = output_dirs[index, instrument_folder]
+                    filename = output_filename(wav_name, profile.format)
+                    wav_path = os.path.join(folder, filename)
 
-                if self.skip_maschine_folders and ogg_path.name.endswith(".mxgrp.ogg"):
-                    logger.info(f"Skipping Maschine file: {ogg_path}")
+                    if existing_files is not None:
+                        if filename in existing_files:
+                            existing += 1
+                            logger.debug(f"Skipping existing file: {wav_path}")
+                            continue
+                        existing_files.add(filename)  # Later previews with the same name are skipped, as if it was written already
+                    targets.append((index, wav_path, settings))
+                if not targets:
+                    progress[0] += 1
+                    report_progress()
                     continue
 
-                if self.skip_battery_kits and ogg_path.name.endswith(".nbkt.ogg"):
-                    logger.info(f"Skipping Battery kit file: {ogg_path}")
-                    continue
-
-                if self.skip_native_browser_preview_library and instrument_folder == "Native Browser Preview Library":
-                    continue
+                original = originals.get(source_key)
+                # Different previews can have the same output path (e.g. same name in the same instrument folder)
+                output_paths = [wav_path for _, wav_path, _ in targets]
+                earlier = {writers[wav_path] for wav_path in output_paths if wav_path in writers}
+                future = pool.submit(convert, ogg_path, targets, original, earlier)
+                if source_key and original is None:
+                    originals[source_key] = future
+                for wav_path in output_paths:
+                    writers[wav_path] = future
+                pending.append((ogg_path, future, output_paths))
+                # Bounded so a huge manifest is not queued at once and results are logged as they come
+                while len(pending) > self.workers * 4 or (pending and pending[0][1].done()):
+                    finish_oldest()
 
-                if self.find_real_instrument_folder and instrument_folder == "Native Browser Preview Library":
-                    try:
-                        # Find the index of the last occurrence of 'Previews/Samples' in the parts
-                        for i in range(len(ogg_path.parts) - 1):
-                            if ogg_path.parts[i].lower() == 'previews' and i + 1 < len(ogg_path.parts) and ogg_path.parts[i + 1].lower() == 'samples':
-                                upid_index = i + 2  # The folder right after 'Previews/Samples'
-                                break
-                        if upid_index:
-                            upid = ogg_path.parts[upid_index]
-                            instrument_folder = self.upids.get(upid, instrument_folder).strip()
-                        else:
-                            logger.warning(f"Cannot find the real instrument folder for preview: {ogg_path}")
-                    except IndexError:
-                        logger.error(f"Index error when looking for the real instrument folder for preview: {ogg_path}")
-                        pass
-
-                wav_path = Path(self.output_folder) / instrument_folder / wav_name
-                wav_path.parent.mkdir(parents=True, exist_ok=True)
-
-                if self.skip_existing and wav_path.exists():
-                    logger.info(f"Skipping existing file: {wav_path}")
-                    continue
-                try:
-                    trim_and_normalize_wav(
-                        input_path=str(ogg_path),
-                        output_path=str(wav_path),
-                        trim_silence=self.trim_silence,
-                        normalize=self.normalize,
-                        sample_rate=self.sample_rate,
-                        bit_depth=self.bit_depth,
-                    )
-                    logger.info(f"Converted {ogg_path} -> {wav_path}")
-                except Exception as e:
-                    logger.error(f"Failed to convert {ogg_path}: {e}")
+            while pending:
+                if worker_instance and worker_instance.cancel_requested():
+                    logger.info("Previews export cancelled by user.")
+                    return 1  # Return non-zero for cancellation
+                finish_oldest()
+            if existing:
+                logger.info(f"Skipped {existing} existing files")
             return 0  # Success
         except Exception as e:
             logger.error(f"Error processing previews: {e}")
             return 1  # Error
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            if catalog:
+                catalog.close()
+            if feature_db:
+                feature_db.close()
+                logger.info(f"Audio features saved to {self.features_db_path}")
 
 
-def main(json_path: str, output_folder: str, trim_silence: bool, normalize: bool, sample_rate: int, bit_depth: int, skip_existing: bool, find_real_instrument_folder: bool, skip_native_browser_preview_library: bool, skip_maschine_folders: bool, skip_battery_kits: bool):
+def main(json_path: str, output_folder: str, trim_silence: bool, normalize: bool, sample_rate: int, bit_depth: int, skip_existing: bool, find_real_instrument_folder: bool, skip_native_browser_preview_library: bool, skip_maschine_folders: bool, skip_battery_kits: bool, output_format: str, compression_level: int, features_db: str, profiles: list[OutputProfile], workers: int, link_pass_through: bool):
     processor = PreviewsProcessor(
         json_path=json_path,
         output_folder=output_folder,
@@ -120,13 +357,19 @@ def main(json_path: str, output_folder: str, trim_silence: bool, normalize: bool
         skip_battery_kits=skip_battery_kits,
         skip_native_browser_preview_library=skip_native_browser_preview_library,
         find_real_instrument_folder=find_real_instrument_folder,
+        output_format=AudioFormat(output_format.upper()),
+        compression_level=compression_level,
+        features_db_path=features_db,
+        profiles=[OutputProfile(output_folder, sample_rate, bit_depth, AudioFormat(output_format.upper()))] + profiles if profiles else None,
+        workers=workers,
+        link_pass_through=link_pass_through,
     )
     sys.exit(processor.run())
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="preview processor")
-    parser.add_argument("json_path", help="Path to input JSON file")
+    parser.add_argument("json_path", help="Path to input JSON file, or to a previews.db catalog")
     parser.add_argument("output_folder", help="Path to output base folder")
     parser.add_argument("--trim_silence", action="store_true", help="Trim silence from wav files")
     parser.add_argument("--normalize", action="store_true", help="Normalize wav files")
@@ -137,9 +380,19 @@ if __name__ == "__main__":
     parser.add_argument("--skip_battery_kits", action="store_true", help="Skip files ending with .nbkt.ogg (Battery kits)")
     parser.add_argument("--skip_native_browser_preview_library", action="store_true", help="Skip 'Native Browser Preview Library' folder")
     parser.add_argument("--find_real_instrument_folder", action="store_true", help="Find real instrument folder for the Preview Library")
+    parser.add_argument("--format", choices=["wav", "flac", "ogg"], default="wav", help="Output audio format, ogg copies the original previews without converting them (default: wav)")
+    parser.add_argument("--link", action="store_true", help="With the ogg format, hard link the original previews instead of copying them when they are on the same drive")
+    parser.add_argument("--compression_level", type=int, default=5, help=f"FLAC compression level, 0 (fastest) to {MAX_FLAC_COMPRESSION_LEVEL} (smallest) (default: 5)")
+    parser.add_argument("--features_db", help="Store duration, peak, RMS, leading silence, channels and sample rate of every source in this SQLite file")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of previews converted in parallel (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--verbose", action="store_true", help="Also list every skipped preview and existing file instead of only their counts")
+    add_profile_argument(parser, PROFILE_FORMATS)
 
     args = parser.parse_args()
 
+    if args.verbose:
+        Logger.set_level("PreviewsProcessor", logging.DEBUG)
+
     # Parameter Validation
     if not Path(args.json_path).is_file():
         logger.error(f"Error: JSON path '{args.json_path}' does not exist or is not a file.")
@@ -160,6 +413,27 @@ if __name__ == "__main__":
         logger.error(f"Error: Bit depth must be a positive integer, got {args.bit_depth}.")
         sys.exit(1)
 
+    if args.format == "flac" and args.bit_depth not in (None, 8, 16, 24):
+        logger.error(f"Error: FLAC supports bit depths of 8, 16 or 24, got {args.bit_depth}.")
+        sys.exit(1)
+
+    if not 0 <= args.compression_level <= MAX_FLAC_COMPRESSION_LEVEL:
+        logger.error(f"Error: Compression level must be between 0 and {MAX_FLAC_COMPRESSION_LEVEL}, got {args.compression_level}.")
+        sys.exit(1)
+
+    if args.format == "ogg" and (args.trim_silence or args.normalize or args.sample_rate or args.bit_depth):
+        logger.warning("Warning: Trim silence, normalize, sample rate and bit depth do not apply to the ogg format, the original previews are copied as they are.")
+
+    if args.workers < 1:
+        logger.error(f"Error: Workers must be a positive integer, got {args.workers}.")
+        sys.exit(1)
+
+    try:
+        profiles = parse_profiles(args.profile, PROFILE_FORMATS)
+    except ValueError as e:
+        logger.error(f"Error: {e}")
+        sys.exit(1)
+
     try:
         main(
             json_path=args.json_path,
@@ -173,6 +447,12 @@ if __name__ == "__main__":
             skip_battery_kits=args.skip_battery_kits,
             skip_native_browser_preview_library=args.skip_native_browser_preview_library,
             find_real_instrument_folder=args.find_real_instrument_folder,
+            output_format=args.format,
+            compression_level=args.compression_level,
+            features_db=args.features_db,
+            profiles=profiles,
+            workers=args.workers,
+            link_pass_through=args.link,
         )
     except SystemExit as e:
         sys.exit(e.code)
@@ -0,0 +1,47 @@
+import sys
+from functools import cache
+from pathlib import Path
+
+from utils.bundle_utils import get_bundled_path
+from utils.logger import Logger
+
+logger = Logger.get_logger("UpidIndex")
+
+UPID_INDEX_PATH = "resources/upids.tsv"  # Compiled from docs/upids/upids.txt by docs/upids/export.py
+
+
+def get_upid_index_path() -> str:
+    """Return the path of the UPID table in the bundle, or in the repository when running from source, whatever the working directory."""
+    if hasattr(sys, "_MEIPASS"):
+        return get_bundled_path(UPID_INDEX_PATH)
+    return str(Path(__file__).resolve().parents[3] / UPID_INDEX_PATH)
+
+
+def find_upid(ogg_path: Path) -> str | None:
+    """Return the UPID folder of a Native Browser Preview Library preview, the one right after 'Previews/Samples'."""
+    parts = ogg_path.parts
+    for i in range(len(parts) - 2):
+        if parts[i].lower() == 'previews' and parts[i + 1].lower() == 'samples':
+            return parts[i + 2]
+    return None
+
+
+@cache
+def load_upid_index() -> dict[str, str]:
+    """
+    Read the UPID -> instrument table the first time it is needed, one 'UPID<TAB>Instrument' line per product.
+    If it cannot be read, a warning is logged once and no real instrument is resolved.
+    """
+    path = get_upid_index_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return dict(line.rstrip("\n").split("\t", 1) for line in f if line.strip())
+    except OSError as e:
+        logger.warning(f"Cannot read the UPID table {path}, real instrument folders will not be resolved: {e}")
+        return {}
+
+
+def resolve_real_instrument(previews_folder: str | Path) -> str | None:
+    """Return the instrument of a Native Browser Preview Library folder, or None if its UPID is unknown."""
+    upid = find_upid(Path(previews_folder))
+    return load_upid_index().get(upid) if upid else None
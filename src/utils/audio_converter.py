@@ -0,0 +1,283 @@
+import os
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+import soundfile as sf
+
+from utils.audio_utils import (MAX_FLAC_COMPRESSION_LEVEL, ConversionJob,
+                               ConversionSettings, get_output_subtype)
+from utils.cache_utils import LRUCache
+from utils.enums import AudioFormat
+from utils.feature_utils import AudioFeatures, compute_features
+from utils.wav_utils import full_scale, lsb, read_pcm_data, read_wav_header
+
+TRIM_SCAN_FRAMES = 4096
+INTEGER_GAIN_SUBTYPES = ('PCM_16', 'PCM_24')
+
+
+def warm_up():
+    """Compile the resampling kernels, which numba otherwise compiles during the first export that resamples."""
+    import resampy
+    resampy.resample(np.zeros((64, 2)), 44100, 48000, axis=0)  # Same layout as the frames x channels audio of Converter
+
+
+class ProcessedAudio(NamedTuple):
+    """Trimmed, normalized and resampled audio ready to be written, with what is known about its source."""
+    data: np.ndarray
+    samplerate: int
+    source_subtype: str
+    source_format: str
+    features: AudioFeatures | None
+
+
+class Converter:
+    """
+    Converts audio files one job at a time, reusing the same working buffers
+    for decoding, trimming and normalizing instead of allocating them per file.
+    Buffers only grow, so after the largest file of a batch no more allocations
+    happen outside of resampling. A converter is not thread-safe, use one per thread.
+    With collect_features, convert() also describes each source while it is decoded.
+    With cache_mb, processed audio of the sources the caller marks as cacheable (those
+    exported more than once in a run, e.g. shared samples or blank fillers) is kept in
+    an LRU cache so they are decoded only once. The converters of several threads can
+    share one cache by passing it instead.
+    Plain PCM WAV sources skip libsndfile: their samples are memory-mapped, peak and
+    trim bounds are found on the integers and only the kept frames are converted to float.
+    When a 16 or 24-bit source is exported at its own bit depth and rate, it is never converted
+    to float at all: the gain is applied with a fixed-point multiply and the integers are written.
+    """
+
+    def __init__(self, collect_features: bool = False, cache_mb: int = 0, cache: LRUCache | None = None):
+        self.collect_features = collect_features
+        self.cache = cache if cache is not None else LRUCache(cache_mb) if cache_mb > 0 else None
+        self._samples = np.empty(0, dtype=np.float64)  # Decoded audio, viewed as (frames, channels)
+        self._int24 = np.empty(0, dtype=np.int32)  # Unpacked 24-bit PCM samples
+        self._wide = np.empty(0, dtype=np.int64)  # Fixed-point products of the integer gain
+        self._energy = np.empty(0, dtype=np.float64)  # Per-frame energy used to trim silence
+        self._mask = np.empty(0, dtype=bool)  # Frames above the silence threshold
+
+    @staticmethod
+    def _reserve(buffer: np.ndarray, size: int) -> np.ndarray:
+        """Return a buffer that can hold at least size items, growing it geometrically if needed."""
+        if buffer.size >= size:
+            return buffer
+        return np.empty(max(size, int(buffer.size * 1.5)), dtype=buffer.dtype)
+
+    def _decode(self, input_path: str):
+        with sf.SoundFile(input_path) as f:
+            frames, channels = f.frames, f.channels
+            self._samples = self._reserve(self._samples, frames * channels)
+            out = self._samples[:frames * channels].reshape(frames, channels)
+            data = f.read(frames, dtype='float64', always_2d=True, out=out)
+            return data, f.samplerate, f.subtype, f.format
+
+    def _map_pcm(self, input_path: str):
+        """Like _decode, but returning integer samples (with their full scale and step) when the source is plain PCM WAV."""
+        header = read_wav_header(input_path)
+        if header is None:
+            return None
+        out = None
+        if header.bits_per_sample == 24:
+            size = header.frames * header.channels
+            self._int24 = self._reserve(self._int24, size)
+            out = self._int24[:size].reshape(header.frames, header.channels)
+        data = read_pcm_data(input_path, header, out)
+        return (data, header.samplerate, header.subtype, header.format,
+                full_scale(data.dtype), lsb(data.dtype, header.bits_per_sample))
+
+    @staticmethod
+    def _nonzero_bounds(data: np.ndarray) -> tuple[int, int]:
+        """Return the first and last frames holding a non-zero sample, scanning from both ends so the middle is never read."""
+        frames = data.shape[0]
+        for block_start in range(0, frames, TRIM_SCAN_FRAMES):
+            loud = np.flatnonzero(data[block_start:block_start + TRIM_SCAN_FRAMES].any(axis=1))
+            if loud.size:
+                start = block_start + int(loud[0])
+                break
+        else:
+            return 0, frames
+        for block_end in range(frames, start, -TRIM_SCAN_FRAMES):
+            block_start = max(block_end - TRIM_SCAN_FRAMES, start)
+            loud = np.flatnonzero(data[block_start:block_end].any(axis=1))
+            if loud.size:
+                return start, block_start + int(loud[-1]) + 1
+        return start, frames
+
+    def _trim_bounds(self, data: np.ndarray, peak: float, step: int = 0) -> tuple[int, int]:
+        """Return the first and last non-silent frames, using a threshold 100 dB below the loudest frame."""
+        frames, channels = data.shape
+        if channels * peak * peak * 1e-10 < step * step:
+            # Even the loudest possible frame puts the threshold below one integer step (always the case
+            # for 16-bit), so every non-zero frame is kept and only the silent ends need to be read
+            return self._nonzero_bounds(data)
+
+        self._energy = self._reserve(self._energy, frames)
+        self._mask = self._reserve(self._mask, frames)
+        energy = self._energy[:frames]
+        mask = self._mask[:frames]
+
+        # Mean square per frame across channels, compared in the power domain (-100 dB == 1e-10)
+        np.einsum('ij,ij->i', data, data, out=energy, dtype=np.float64)
+        threshold = energy.max() * 1e-10
+        np.greater(energy, threshold, out=mask)
+        if not mask.any():
+            return 0, frames
+        start = int(mask.argmax())
+        end = frames - int(mask[::-1].argmax())
+        return start, end
+
+    def _integer_gain(self, data: np.ndarray, gain: float, step: int) -> np.ndarray:
+        """Scale integer samples by gain (at most up to full scale) with rounding, keeping their dtype and alignment."""
+        shift = step.bit_length() - 1  # 24-bit samples sit in the top bytes of int32
+        # |sample * multiplier| <= full scale * 2 ** fraction_bits == 2 ** 62, so int64 never overflows
+        # and the result never exceeds the peak, which is why no clipping pass is needed
+        fraction_bits = 63 - data.dtype.itemsize * 8
+        multiplier = np.int64(round(gain * (1 << fraction_bits)))
+        self._wide = self._reserve(self._wide, data.size)
+        wide = self._wide[:data.size].reshape(data.shape)
+        np.multiply(data, multiplier, out=wide)
+        np.add(wide, np.int64(1 << (fraction_bits + shift - 1)), out=wide)
+        np.right_shift(wide, fraction_bits + shift, out=wide)
+        if shift:
+            np.left_shift(wide, shift, out=wide)
+        return wide.astype(data.dtype)
+
+    def _process_targets(self, input_path: str, settings_list: list[ConversionSettings]) -> list[ProcessedAudio]:
+        first = settings_list[0]
+        if any(settings.trim_silence != first.trim_silence or settings.normalize != first.normalize for settings in settings_list):
+            raise ValueError("All targets of a source must share the trim and normalize settings")
+
+        mapped = self._map_pcm(input_path)
+        if mapped is None:
+            data, sr, source_subtype, source_format = self._decode(input_path)
+            scale, step = 1.0, 0
+        else:
+            data, sr, source_subtype, source_format, scale, step = mapped
+
+        peak = max(float(data.max(initial=0)), -float(data.min(initial=0)))
+        features = compute_features(data, sr, peak, scale) if self.collect_features else None
+
+        # Only trim if audio is not completely silent
+        if peak > 0 and first.trim_silence:
+            start, end = self._trim_bounds(data, peak, step)
+            data = data[start:end]
+
+        integer_data = None
+        float_data = None
+        by_rate = {}  # Float audio per output sample rate, so each rate is resampled once
+        results = []
+        for settings in settings_list:
+            resample = bool(settings.sample_rate) and sr != settings.sample_rate
+            if (step and not resample and source_subtype in INTEGER_GAIN_SUBTYPES
+                    and get_output_subtype(settings.format, settings.bit_depth, source_subtype, source_format) == source_subtype):
+                if integer_data is None:
+                    integer_data = self._integer_gain(data, 0.999 * scale / peak, step) if first.normalize and peak > 0 else data
+                results.append(ProcessedAudio(integer_data, sr, source_subtype, source_format, features))
+                continue
+
+            if float_data is None:
+                # Full scale is a power of two, so scaling integers gives exactly the floats libsndfile would decode
+                gain = 0.999 / peak if first.normalize and peak > 0 else 1.0 / scale  # 0.999 avoids clipping
+                if data.dtype != np.float64:
+                    # Single pass converting the kept integer frames to float and applying the gain
+                    self._samples = self._reserve(self._samples, data.size)
+                    float_data = np.multiply(data, gain, out=self._samples[:data.size].reshape(data.shape))
+                else:
+                    float_data = np.multiply(data, gain, out=data) if gain != 1.0 else data
+
+            # Resample if needed
+            rate = settings.sample_rate if resample else sr
+            if rate not in by_rate:
+                if resample:
+                    import resampy  # Imported on first use, it loads numba which takes longer than the other audio libraries
+                    by_rate[rate] = resampy.resample(float_data, sr, rate, axis=0)
+                else:
+                    by_rate[rate] = float_data
+            results.append(ProcessedAudio(by_rate[rate], rate, source_subtype, source_format, features))
+        return results
+
+    def _cache_key(self, input_path: str, stat: os.stat_result, settings: ConversionSettings) -> tuple:
+        # Bit depth and format are part of the key as they decide whether integers or floats are kept
+        return (os.path.abspath(input_path), stat.st_mtime_ns, stat.st_size, settings.trim_silence, settings.normalize,
+                settings.sample_rate, settings.bit_depth, settings.format, self.collect_features)
+
+    def _in_buffers(self, data: np.ndarray) -> bool:
+        """Return whether data is a view into the working buffers, which the next decode overwrites."""
+        return any(np.may_share_memory(data, buffer) for buffer in (self._samples, self._int24, self._wide))
+
+    def process_targets(self, input_path: str, settings_list: list[ConversionSettings], cacheable: bool = True) -> list[ProcessedAudio]:
+        """
+        Decode and trim a source once and return its audio for each of the settings, serving repeated
+        sources from the cache when enabled. The settings may only differ in rate, bit depth and format.
+        Sources that will not be requested again are passed with cacheable=False, so they are neither
+        looked up nor copied into the cache.
+        """
+        if self.cache is None or not cacheable:
+            return self._process_targets(input_path, settings_list)
+
+        stat = os.stat(input_path)
+        keys = [self._cache_key(input_path, stat, settings) for settings in settings_list]
+        audios = [self.cache.get(key) for key in keys]
+        missing = [i for i, audio in enumerate(audios) if audio is None]
+        if missing:
+            for i, audio in zip(missing, self._process_targets(input_path, [settings_list[i] for i in missing])):
+                if self._in_buffers(audio.data):
+                    audio = audio._replace(data=audio.data.copy())
+                self.cache.put(keys[i], audio, audio.data.nbytes)
+                audios[i] = audio
+        return audios
+
+    def process(self, input_path: str, settings: ConversionSettings = ConversionSettings()) -> ProcessedAudio:
+        """Decode and process a source, serving repeated sources from the cache when enabled."""
+        return self.process_targets(input_path, [settings])[0]
+
+    def write(self, audio: ProcessedAudio, output_path: str, settings: ConversionSettings = ConversionSettings()):
+        subtype = get_output_subtype(settings.format, settings.bit_depth, audio.source_subtype, audio.source_format)
+
+        if audio.data.size == 0:
+            raise RuntimeError(f"No audio data to write for '{output_path}'")
+        compression_level = None
+        if settings.format == AudioFormat.FLAC:
+            compression_level = settings.compression_level / MAX_FLAC_COMPRESSION_LEVEL
+        try:
+            sf.write(output_path, audio.data, audio.samplerate, subtype=subtype, format=settings.format.value,
+                     compression_level=compression_level)
+        except Exception as e:
+            # Safety check: remove empty files (header only)
+            if os.path.exists(output_path) and os.path.getsize(output_path) <= 44:
+                os.remove(output_path)
+                raise RuntimeError(f"{settings.format.value} file '{output_path}' is empty or invalid (44 bytes) and was deleted")
+            raise RuntimeError(f"Failed to write '{output_path}': {e}") from e
+
+    def convert(self, input_path: str, output_path: str, settings: ConversionSettings = ConversionSettings()) -> AudioFeatures | None:
+        return self.convert_targets(input_path, [(output_path, settings)])
+
+    def convert_targets(self, input_path: str, targets: list[tuple[str, ConversionSettings]], cacheable: bool = True) -> AudioFeatures | None:
+        """Write a source to every (output path, settings) target, decoding and trimming it only once."""
+        audios = self.process_targets(input_path, [settings for _, settings in targets], cacheable)
+        for (output_path, settings), audio in zip(targets, audios):
+            self.write(audio, output_path, settings)
+        return audios[0].features
+
+    def run(self, jobs: Iterable[ConversionJob]) -> Iterator[tuple[ConversionJob, Exception | None]]:
+        """Convert jobs as they are streamed in, yielding each job with its error (None on success)."""
+        for job in jobs:
+            try:
+                self.convert(job.input_path, job.output_path, job.settings)
+                yield job, None
+            except Exception as e:
+                yield job, e
+
+
+def trim_and_normalize_wav(
+    input_path: str,
+    output_path: str,
+    trim_silence: bool = True,
+    normalize: bool = True,
+    sample_rate: int | None = None,
+    bit_depth: int | None = None,
+    audio_format: AudioFormat = AudioFormat.WAV,
+    compression_level: int = 5,
+):
+    settings = ConversionSettings(trim_silence, normalize, sample_rate, bit_depth, audio_format, compression_level)
+    Converter().convert(input_path, output_path, settings)
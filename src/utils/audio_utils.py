@@ -1,62 +1,96 @@
-import os
-
-import numpy as np
-import resampy
-import soundfile as sf
-
-
-def trim_and_normalize_wav(
-    input_path: str,
-    output_path: str,
-    trim_silence: bool = True,
-    normalize: bool = True,
-    sample_rate: int | None = None,
-    bit_depth: int | None = None,
-):
-    # Load audio
-    data, sr = sf.read(input_path, always_2d=True)
-    info = sf.info(input_path)
-    data = data.T  # shape: (channels, samples)
-
-    # Only process if audio is not completely silent
-    if np.any(np.abs(data) > 0):
-        if trim_silence:
-            # Compute RMS per frame across channels
-            rms = np.sqrt(np.mean(data**2, axis=0))
-            rms_db = 20 * np.log10(np.maximum(rms, 1e-12))
-            threshold_db = rms_db.max() - 100  # relative threshold
-            non_silent_idx = np.where(rms_db > threshold_db)[0]
-            if non_silent_idx.size > 0:
-                start, end = non_silent_idx[0], non_silent_idx[-1] + 1
-                data = data[:, start:end]
-
-        if normalize:
-            peak = np.max(np.abs(data))
-            if peak > 0:
-                data = data / peak * 0.999  # avoid clipping
-
-    # Resample if needed
-    if sample_rate and sr != sample_rate:
-        data = np.array([resampy.resample(ch, sr, sample_rate) for ch in data])
-        sr = sample_rate
-
-    # Determine subtype
-    subtype_map = {8: 'PCM_U8', 16: 'PCM_16', 24: 'PCM_24', 32: 'PCM_32'}
+import argparse
+from dataclasses import dataclass
+from typing import NamedTuple
+
+from utils.enums import AudioFormat
+
+SUBTYPE_MAP = {8: 'PCM_U8', 16: 'PCM_16', 24: 'PCM_24', 32: 'PCM_32'}
+FLAC_SUBTYPE_MAP = {8: 'PCM_S8', 16: 'PCM_16', 24: 'PCM_24'}
+MAX_FLAC_COMPRESSION_LEVEL = 8
+DEFAULT_CACHE_MB = 256
+DEFAULT_WORKERS = 1
+
+
+def output_filename(filename: str, audio_format: AudioFormat) -> str:
+    """Return filename with the extension of the output format, WAV names are kept untouched."""
+    if audio_format == AudioFormat.WAV:
+        return filename
+    # rpartition instead of splitext so extension-only names like the default '.wav' filler are handled too
+    stem, dot, _ = filename.rpartition(".")
+    return (stem if dot else filename) + "." + audio_format.value.lower()
+
+
+def get_output_subtype(audio_format: AudioFormat, bit_depth: int | None, source_subtype: str, source_format: str) -> str:
+    """Resolve the subtype to write, keeping the source one when no bit depth is requested."""
+    if audio_format == AudioFormat.FLAC:
+        if bit_depth:
+            subtype = FLAC_SUBTYPE_MAP.get(bit_depth)
+            if subtype is None:
+                raise ValueError(f"Unsupported bit depth for FLAC: {bit_depth}")
+            return subtype
+        return source_subtype if source_subtype in FLAC_SUBTYPE_MAP.values() else "PCM_24"
+
     if bit_depth:
-        subtype = subtype_map.get(bit_depth)
+        subtype = SUBTYPE_MAP.get(bit_depth)
         if subtype is None:
             raise ValueError(f"Unsupported bit depth: {bit_depth}")
-    else:
-        subtype = info.subtype if info.format == "WAV" else "PCM_24"
-
-    # Write audio
-    if data.size == 0:
-        raise RuntimeError(f"No audio data to write for '{output_path}'")
-    try:
-        sf.write(output_path, data.T, sr, subtype=subtype, format="WAV")
-    except Exception as e:
-        # Safety check: remove empty WAV files
-        if os.path.exists(output_path) and os.path.getsize(output_path) <= 44:
-            os.remove(output_path)
-            raise RuntimeError(f"WAV file '{output_path}' is empty or invalid (44 bytes) and was deleted")
-        raise RuntimeError(f"Failed to write '{output_path}': {e}") from e
+        return subtype
+    return source_subtype if source_format == "WAV" else "PCM_24"
+
+
+@dataclass(frozen=True)
+class ConversionSettings:
+    """Processing options applied to a conversion job."""
+    trim_silence: bool = True
+    normalize: bool = True
+    sample_rate: int | None = None
+    bit_depth: int | None = None
+    format: AudioFormat = AudioFormat.WAV
+    compression_level: int = 5  # FLAC only, 0 (fastest) to 8 (smallest)
+
+
+class ConversionJob(NamedTuple):
+    input_path: str
+    output_path: str
+    settings: ConversionSettings
+
+
+class OutputProfile(NamedTuple):
+    """Destination of an export, e.g. 44.1 kHz / 16-bit WAV for a sampler and 48 kHz / 24-bit for a DAW."""
+    output_folder: str
+    sample_rate: int | None = None
+    bit_depth: int | None = None
+    format: AudioFormat = AudioFormat.WAV
+
+    def settings(self, trim_silence: bool, normalize: bool, compression_level: int = 5) -> ConversionSettings:
+        return ConversionSettings(trim_silence, normalize, self.sample_rate, self.bit_depth, self.format, compression_level)
+
+
+def _format_names(formats: tuple[AudioFormat, ...]) -> str:
+    names = [audio_format.value.lower() for audio_format in formats]
+    return " or ".join([", ".join(names[:-1]), names[-1]]) if len(names) > 1 else names[0]
+
+
+def add_profile_argument(parser: argparse.ArgumentParser, formats: tuple[AudioFormat, ...]):
+    """Add the repeatable --profile option of the command line exporters, read with parse_profiles."""
+    parser.add_argument("--profile", nargs=4, action="append", default=[], metavar=("FOLDER", "SAMPLE_RATE", "BIT_DEPTH", "FORMAT"),
+                        help=f"Also export to another folder with its own sample rate, bit depth (0 keeps the source one) and format ({_format_names(formats)}), "
+                             "e.g. --profile out/daw 48000 24 flac. Can be repeated, sources are decoded once for all outputs")
+
+
+def parse_profiles(values: list[list[str]], formats: tuple[AudioFormat, ...]) -> list[OutputProfile]:
+    """Build an OutputProfile from each --profile option, raising ValueError with the message to show when one is invalid."""
+    profiles = []
+    for folder, sample_rate, bit_depth, audio_format in values:
+        try:
+            profile = OutputProfile(folder, int(sample_rate) or None, int(bit_depth) or None, AudioFormat(audio_format.upper()))
+        except ValueError:
+            raise ValueError(f"Invalid profile '{folder} {sample_rate} {bit_depth} {audio_format}', expected FOLDER SAMPLE_RATE BIT_DEPTH FORMAT (e.g. out/mpc 44100 16 wav).") from None
+        if (profile.sample_rate or 0) < 0 or (profile.bit_depth or 0) < 0:
+            raise ValueError(f"Sample rate and bit depth of profile '{folder}' must be positive integers or 0.")
+        if profile.format not in formats:
+            raise ValueError(f"Profiles can only be exported as {_format_names(formats)}, got {audio_format} for profile '{folder}'.")
+        if profile.format == AudioFormat.FLAC and profile.bit_depth not in (None, *FLAC_SUBTYPE_MAP):
+            raise ValueError(f"FLAC supports bit depths of 8, 16 or 24, got {profile.bit_depth} for profile '{folder}'.")
+        profiles.append(profile)
+    return profiles
@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+BYTES_PER_MB = 1024 * 1024
+
+
+class LRUCache:
+    """
+    Least recently used cache bounded by a memory budget instead of an item count.
+    Keeps hit/miss and eviction statistics for the end-of-run report.
+    Thread-safe, so the converters of several export threads can share one budget.
+    """
+
+    def __init__(self, budget_mb: int):
+        self.budget_bytes = budget_mb * BYTES_PER_MB
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted_bytes = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int):
+        if nbytes > self.budget_bytes:
+            return  # Would evict everything else and still not fit
+        with self._lock:
+            if key in self._entries:
+                self.size_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.size_bytes += nbytes
+            while self.size_bytes > self.budget_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted
+                self.evicted_bytes += evicted
+
+    def report(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        return (f"{self.hits}/{lookups} hits ({hit_rate:.1f}%), "
+                f"{self.evicted_bytes / BYTES_PER_MB:.1f} MB evicted, "
+                f"{self.size_bytes / BYTES_PER_MB:.1f} MB in use")
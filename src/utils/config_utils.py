@@ -2,16 +2,25 @@ import json
 import logging
 import os
 import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-from PyQt6.QtWidgets import QMessageBox
+from PyQt6 import QtCore
+from PyQt6.QtWidgets import QApplication, QMessageBox
 
 from dialogs.error_dialog import ErrorDialog
 from models.config import Config
-from utils.constants import CONFIG_FILE
+from utils.constants import CONFIG_FILE, get_data_dir
 from utils.logger import Logger
 
 logger = Logger.get_logger("ConfigUtils", logging.DEBUG)
 
+SAVE_DELAY_MS = 500  # Changes made within this time of each other are written together
+
+_save_timer = None
+_pending_config = None
+_writer = None
+
 def migrate_config_data(data: dict) -> dict:
 
     # Future migrations can be chained like this:
@@ -23,8 +32,7 @@ def migrate_config_data(data: dict) -> dict:
 
 def load_config():
     if not os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'w') as file:
-            file.write(Config().model_dump_json(indent=2))
+        _get_writer().submit(_write_config_file, Config().model_dump_json(indent=2)).result()
     try:
         with open(CONFIG_FILE, 'r') as file:
             config_data = json.load(file)
@@ -49,8 +57,75 @@ def load_config():
         sys.exit(0)
 
 def save_config(config: Config):
+    """Write config now, replacing any save scheduled with schedule_save_config, and wait until it is on disk."""
+    _cancel_scheduled_save()
+    _get_writer().submit(_write_config_file, config.model_dump_json(indent=2)).result()
+
+
+def schedule_save_config(config: Config):
+    """
+    Save config once it has not changed for SAVE_DELAY_MS, for changes made from the UI (e.g. typing in a path field).
+    Must be called from the GUI thread. The config is serialized there, the file is written by a background thread.
+    Call flush_config when the window editing it is closed, the pending save is also written when the application quits.
+    """
+    global _save_timer, _pending_config
+    if _save_timer is None:
+        _save_timer = QtCore.QTimer()
+        _save_timer.setSingleShot(True)
+        _save_timer.timeout.connect(flush_config)
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(lambda: flush_config(wait=True))
+    _pending_config = config  # Each save rewrites the whole file, so only the latest config needs to be written
+    _save_timer.start(SAVE_DELAY_MS)
+
+
+def flush_config(wait: bool = False):
+    """Start writing the config scheduled with schedule_save_config right away, if there is one."""
+    config = _cancel_scheduled_save()
+    if config is not None:
+        future = _get_writer().submit(_write_config_file, config.model_dump_json(indent=2))
+        if wait:
+            future.result()
+
+
+def _cancel_scheduled_save() -> Config | None:
+    global _pending_config
+    if _save_timer is not None:
+        _save_timer.stop()
+    config, _pending_config = _pending_config, None
+    return config
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    # A single thread, so the writes land in the order they were made
+    global _writer
+    if _writer is None:
+        _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ConfigWriter")
+    return _writer
+
+
+def _write_config_file(data: str):
+    """Write to a temporary file next to the config and move it over, so a crash can't leave a truncated config."""
     try:
-        with open(CONFIG_FILE, 'w') as file:
-            file.write(config.model_dump_json(indent=2))
-    except (FileNotFoundError, json.JSONDecodeError) as error:
-        logger.error(error)
+        get_data_dir()
+        try:
+            mode = os.stat(CONFIG_FILE).st_mode & 0o777  # Keep the permissions of the config being replaced
+        except OSError:
+            mode = None
+        # Created like open() would (unlike mkstemp, which makes it private), so a new config gets the default permissions
+        temp_path = os.path.join(os.path.dirname(CONFIG_FILE), f"config.{uuid.uuid4().hex}.tmp")
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            if mode is not None:
+                os.chmod(temp_path, mode)
+            os.replace(temp_path, CONFIG_FILE)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    except OSError as error:
+        logger.error(f"Error saving config: {error}")
@@ -4,12 +4,16 @@ from appdirs import user_data_dir
 
 from utils.bundle_utils import get_bundled_path
 
+# Only paths, the directories are created by the code that writes to them
+DATA_PATH = user_data_dir("NITools", False)
+CONFIG_FILE = os.path.join(DATA_PATH, "config.json")
+LOGS_PATH = os.path.join(DATA_PATH, "logs")
+
 
 def get_data_dir():
     '''Get the data directory, cross-platform compatible'''
-    data_dir = user_data_dir("NITools", False)
-    os.makedirs(data_dir, exist_ok=True)
-    return data_dir
+    os.makedirs(DATA_PATH, exist_ok=True)
+    return DATA_PATH
 
 def get_dir(dir_name):
     '''Get directory'''
@@ -21,7 +25,3 @@ def get_file(file_name):
     '''Get file'''
     dir_path = get_data_dir()
     return os.path.join(dir_path, file_name)
-
-
-CONFIG_FILE = get_file("config.json")
-LOGS_PATH = get_dir("logs")
@@ -5,3 +5,8 @@ class Style(str, Enum):
     AUTO = "Auto"
     DARK = "Dark"
     LIGHT = "Light"
+
+class AudioFormat(str, Enum):
+    WAV = "WAV"
+    FLAC = "FLAC"
+    OGG = "OGG"  # Previews only, the original OGG file is passed through without decoding
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+from typing import NamedTuple
+
+import numpy as np
+
+from utils.file_utils import partial_hash
+
+LEADING_SILENCE_THRESHOLD = 10 ** (-60 / 20)  # -60 dBFS
+SCAN_BLOCK_FRAMES = 4096
+COMMIT_INTERVAL = 200  # Rows written between commits
+
+
+class AudioFeatures(NamedTuple):
+    """Cheap descriptors of a decoded source, levels are linear (1.0 == full scale)."""
+    duration: float  # Seconds
+    peak: float
+    rms: float
+    leading_silence: float  # Seconds before the signal first reaches -60 dBFS
+    channels: int
+    sample_rate: int
+
+
+def compute_features(data: np.ndarray, samplerate: int, peak: float | None = None, full_scale: float = 1.0) -> AudioFeatures:
+    """Describe audio shaped (frames, channels) without allocating signal-sized arrays."""
+    frames, channels = data.shape
+    if peak is None:
+        peak = max(float(data.max(initial=0)), -float(data.min(initial=0)))
+
+    leading_frames = frames
+    threshold = LEADING_SILENCE_THRESHOLD * full_scale
+    sum_squares = 0.0
+    for start in range(0, frames, SCAN_BLOCK_FRAMES):
+        block = data[start:start + SCAN_BLOCK_FRAMES].astype(np.float64)
+        sum_squares += float(np.einsum('ij,ij->', block, block))
+        if leading_frames == frames:
+            loud = np.flatnonzero((np.abs(block) > threshold).any(axis=1))
+            if loud.size:
+                leading_frames = start + int(loud[0])
+    rms = (sum_squares / data.size) ** 0.5 if data.size else 0.0
+
+    return AudioFeatures(
+        duration=frames / samplerate,
+        peak=peak / full_scale,
+        rms=rms / full_scale,
+        leading_silence=leading_frames / samplerate,
+        channels=channels,
+        sample_rate=samplerate,
+    )
+
+
+class FeatureDatabase:
+    """
+    SQLite sidecar storing the features of every exported source, keyed by source path and content hash.
+    Allows queries such as short kicks or mono samples without decoding the library again, e.g.:
+    SELECT source_path FROM features WHERE source_path LIKE '%kick%' AND duration < 0.3
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection = sqlite3.connect(db_path)
+        self._connection.row_factory = sqlite3.Row
+        self._pending = 0
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS features (
+                source_path TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                duration REAL NOT NULL,
+                peak REAL NOT NULL,
+                rms REAL NOT NULL,
+                leading_silence REAL NOT NULL,
+                channels INTEGER NOT NULL,
+                sample_rate INTEGER NOT NULL,
+                PRIMARY KEY (source_path, source_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_features_duration ON features (duration);
+            CREATE INDEX IF NOT EXISTS idx_features_channels ON features (channels);
+        """)
+
+    def add(self, source_path: str, features: AudioFeatures):
+        """Store the features of a source, replacing the ones of previous versions of the file."""
+        source_hash = partial_hash(source_path)
+        self._connection.execute("DELETE FROM features WHERE source_path = ? AND source_hash <> ?", (source_path, source_hash))
+        self._connection.execute(
+            "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (source_path, source_hash, *features),
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_INTERVAL:
+            self._connection.commit()
+            self._pending = 0
+
+    def query(self, where: str = "1", params: tuple = ()) -> list[sqlite3.Row]:
+        """Return the rows matching an SQL condition, e.g. query("channels = ?", (1,))."""
+        return self._connection.execute(f"SELECT * FROM features WHERE {where} ORDER BY source_path", params).fetchall()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
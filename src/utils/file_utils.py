@@ -1,6 +1,8 @@
 
-import re
+import hashlib
 import os
+import re
+from collections import defaultdict
 
 def sanitize(s: str):
     """
@@ -31,3 +33,93 @@ def ensure_unique_path(folder: str, filename: str) -> str:
         candidate = f"{base}_{n}{ext}"
         n += 1
     return os.path.join(folder, candidate)
+
+
+def partial_hash(path: str, chunk_size: int = 64 * 1024) -> str:
+    """
+    Cheap content fingerprint: hashes the file size plus its first and last chunks,
+    so large files can be identified without reading them completely.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(chunk_size))
+        if size > chunk_size:
+            f.seek(max(chunk_size, size - chunk_size))
+            digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash the whole content of a file, to confirm files whose partial_hash matched."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_duplicate_files(paths: list[str], chunk_size: int = 64 * 1024) -> dict[int, int]:
+    """
+    Map the index of every path whose content already appeared earlier in paths to the index of its first occurrence.
+    Paths reaching the same file (symlinks, hard links) are matched by inode without reading them. Distinct files
+    are only hashed when their size matches another one, first partially and then fully to rule out collisions.
+    Paths that cannot be accessed are left out.
+    """
+    duplicates = {}
+    inodes = {}
+    sizes = defaultdict(list)
+    for index, path in enumerate(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        inode = (stat.st_dev, stat.st_ino)
+        if inode in inodes:
+            duplicates[index] = inodes[inode]
+            continue
+        inodes[inode] = index
+        sizes[stat.st_size].append(index)
+
+    for size, indices in sizes.items():
+        if len(indices) < 2:
+            continue
+        candidates = defaultdict(list)
+        for index in indices:
+            try:
+                candidates[partial_hash(paths[index], chunk_size)].append(index)
+            except OSError:
+                continue
+        for same_partial in candidates.values():
+            if len(same_partial) < 2:
+                continue
+            if size <= 2 * chunk_size:
+                first = same_partial[0]  # The partial hash already covered the whole file
+                duplicates.update((index, first) for index in same_partial[1:])
+                continue
+            originals = {}
+            for index in same_partial:
+                try:
+                    digest = file_hash(paths[index])
+                except OSError:
+                    continue
+                if digest in originals:
+                    duplicates[index] = originals[digest]
+                else:
+                    originals[digest] = index
+
+    # A link to a file that duplicates an earlier one points to that earlier one
+    for index, original in duplicates.items():
+        duplicates[index] = duplicates.get(original, original)
+    return duplicates
+
+
+def get_drive_id(path) -> int | str:
+    """
+    Identify the device holding path, so work can be limited per physical drive.
+    Falls back to the path anchor (e.g. 'D:\\') when the path cannot be accessed.
+    """
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return os.path.splitdrive(os.path.abspath(path))[0] or os.sep
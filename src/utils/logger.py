@@ -1,16 +1,77 @@
+import atexit
+import itertools
 import logging
+import multiprocessing
 import os
+import queue
 import sys
-from concurrent_log_handler import ConcurrentRotatingFileHandler as RotatingFileHandler
+import threading
+from logging.handlers import QueueHandler, QueueListener
 
 import colorlog
 
 from utils.constants import LOGS_PATH
 
 
+class _LocalQueueHandler(QueueHandler):
+    """Enqueue records of this process as they are, so even the message is only formatted by the listener."""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if Logger._listener is None:
+            Logger._get_listener()  # Opens the log file with the first record, not when the loggers are created
+        super().enqueue(record)
+
+
+class _ProcessQueueHandler(QueueHandler):
+    """Handler of child processes, writing each record to the pipe right away, so none is still buffered when a run returns."""
+
+    def enqueue(self, record):
+        self.queue.put(record)
+
+
+class _ProcessQueueForwarder(QueueListener):
+    """Moves the records of child processes to the listener queue, reading a multiprocessing SimpleQueue."""
+
+    def dequeue(self, block):
+        return self.queue.get()
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class _LogListener(QueueListener):
+    """Listener that also wakes up the callers of Logger.flush once every record queued before them is handled."""
+
+    def handle(self, record):
+        flush_id = getattr(record, "flush_id", None)
+        if flush_id is not None:
+            Logger._flush_events.pop(flush_id).set()
+            return
+        super().handle(record)
+
+
 class Logger:
+    """
+    Loggers only put their records in a queue. A single background listener formats them and fans
+    them out to the console, the shared log file and the handlers added with add_handler, so logging
+    costs the calling thread little more than an enqueue.
+    The listener and the log file are only set up when the first record is emitted, so creating loggers
+    (e.g. when importing the processors) does no filesystem work.
+    """
+    _queue = queue.SimpleQueue()
     _loggers = {}
     _file_handler = None
+    _queue_handler = None
+    _listener = None
+    _process_queue = None  # Shared with child processes, forwarded to the listener
+    _process_forwarder = None
+    _process_users = 0  # process_config calls not released yet
+    _flush_events = {}
+    _flush_ids = itertools.count()
+    _lock = threading.Lock()
 
     @staticmethod
     def get_logger(name="default", level=logging.INFO) -> logging.Logger:
@@ -18,16 +79,115 @@ class Logger:
             Logger._loggers[name] = Logger(name, level)._logger
         return Logger._loggers[name]
 
-    def __init__(self, name, level=logging.INFO):
-        if name in Logger._loggers:
-            self._logger = Logger._loggers[name]
+    @staticmethod
+    def set_level(name: str, level: int):
+        """Change the level of a logger, e.g. to show debug messages on request."""
+        Logger.get_logger(name, level).setLevel(level)
+
+    @staticmethod
+    def add_handler(handler: logging.Handler):
+        """Send every record to handler too, from the listener thread. Add a logging.Filter to receive a single logger."""
+        listener = Logger._get_listener()
+        with Logger._lock:
+            listener.handlers = listener.handlers + (handler,)
+
+    @staticmethod
+    def remove_handler(handler: logging.Handler):
+        listener = Logger._get_listener()
+        with Logger._lock:
+            listener.handlers = tuple(h for h in listener.handlers if h is not handler)
+
+    @staticmethod
+    def flush(timeout: float | None = 5):
+        """Wait until the listener handled every record logged so far, including those of finished child processes."""
+        if Logger._listener is None or Logger._listener._thread is None:
             return
+        flush_id = next(Logger._flush_ids)
+        event = Logger._flush_events[flush_id] = threading.Event()
+        marker = logging.makeLogRecord({"flush_id": flush_id})
+        # Markers go through the process queue when it is used, so they queue up behind the records of children
+        process_queue = Logger._process_queue
+        try:
+            (process_queue or Logger._listener.queue).put(marker)
+        except (OSError, ValueError):  # Closed by release_process_config meanwhile, its records were all handled
+            Logger._listener.queue.put(marker)
+        event.wait(timeout)
 
-        self._logger = logging.getLogger(name)
-        self._logger.setLevel(level)
-        self._logger.propagate = False
+    @staticmethod
+    def process_config() -> tuple:
+        """
+        Return the arguments of Logger.configure_process, to be passed to child processes
+        (e.g. as initargs of a ProcessPoolExecutor) so their records reach the listener of this process.
+        Call release_process_config once those processes exited.
+        """
+        Logger._get_listener()
+        with Logger._lock:
+            if Logger._process_queue is None:
+                # A spawn queue can be passed to children started with any method, the default one could not go to spawned ones
+                Logger._process_queue = multiprocessing.get_context("spawn").SimpleQueue()
+                # The listener queue only gets records of this process, so it does not need to be picklable
+                Logger._process_forwarder = _ProcessQueueForwarder(Logger._process_queue, QueueHandler(Logger._listener.queue))
+                Logger._process_forwarder.start()
+                atexit.register(Logger.shutdown)  # Again, to stop the forwarder before multiprocessing cleans up at exit
+            Logger._process_users += 1
+        return Logger._process_queue, {name: logger.level for name, logger in Logger._loggers.items()}
+
+    @staticmethod
+    def release_process_config():
+        """Once every process_config call is released, stop forwarding the records of child processes and close their queue."""
+        with Logger._lock:
+            Logger._process_users -= 1
+            if Logger._process_users > 0:
+                return
+        Logger._stop_process_forwarder()
+
+    @staticmethod
+    def configure_process(process_queue, levels: dict[str, int]):
+        """Run in a child process to queue its records to the parent instead of handling them itself."""
+        Logger._queue_handler = _ProcessQueueHandler(process_queue)  # Formats messages before pickling them
+        Logger._listener = None
+        Logger._process_queue = None
+        for logger in Logger._loggers.values():  # Loggers inherited from a forked parent
+            logger.handlers = [Logger._queue_handler]
+        for name, level in levels.items():
+            Logger.set_level(name, level)
+
+    @staticmethod
+    def shutdown():
+        """Handle the remaining records and stop the background threads."""
+        Logger._stop_process_forwarder()
+        if Logger._listener is not None and Logger._listener._thread is not None:
+            Logger._listener.stop()
+
+    @staticmethod
+    def _stop_process_forwarder():
+        with Logger._lock:
+            forwarder, process_queue = Logger._process_forwarder, Logger._process_queue
+            Logger._process_forwarder = Logger._process_queue = None
+            Logger._process_users = 0
+        if forwarder is not None and forwarder._thread is not None:
+            forwarder.stop()  # Queues a sentinel behind the records of the children and joins the thread
+        if process_queue is not None:
+            process_queue.close()  # Its semaphores are released with it, instead of being reported as leaked at exit
+
+    @staticmethod
+    def _get_listener() -> QueueListener:
+        with Logger._lock:
+            if Logger._listener is None:
+                Logger._listener = _LogListener(Logger._queue, Logger._console_handler(), Logger._get_file_handler(),
+                                                respect_handler_level=True)
+                Logger._listener.start()
+                atexit.register(Logger.shutdown)
+            return Logger._listener
 
-        # Console handler
+    @staticmethod
+    def _get_queue_handler() -> QueueHandler:
+        if Logger._queue_handler is None:
+            Logger._queue_handler = _LocalQueueHandler(Logger._queue)
+        return Logger._queue_handler
+
+    @staticmethod
+    def _console_handler() -> logging.Handler:
         formatter_console = colorlog.ColoredFormatter(
             '%(log_color)s%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S',
@@ -40,12 +200,14 @@ class Logger:
             }
         )
         ch = logging.StreamHandler()
-        ch.setLevel(level)
         ch.setFormatter(formatter_console)
-        self._logger.addHandler(ch)
+        return ch
 
-        # Shared file handler
+    @staticmethod
+    def _get_file_handler() -> logging.Handler:
         if Logger._file_handler is None:
+            # Imported here, it loads portalocker and importlib.metadata, which takes longer than the rest of the logger
+            from concurrent_log_handler import ConcurrentRotatingFileHandler as RotatingFileHandler
             os.makedirs(LOGS_PATH, exist_ok=True)
             log_file = os.path.join(LOGS_PATH, 'NITools.log')
             Logger._file_handler = RotatingFileHandler(
@@ -57,7 +219,17 @@ class Logger:
             Logger._file_handler.setFormatter(logging.Formatter(
                 '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
             ))
-        self._logger.addHandler(Logger._file_handler)
+        return Logger._file_handler
+
+    def __init__(self, name, level=logging.INFO):
+        if name in Logger._loggers:
+            self._logger = Logger._loggers[name]
+            return
+
+        self._logger = logging.getLogger(name)
+        self._logger.setLevel(level)
+        self._logger.propagate = False
+        self._logger.addHandler(Logger._get_queue_handler())
 
         Logger._loggers[name] = self._logger
 
@@ -70,3 +242,4 @@ class Logger:
             sys.__excepthook__(exc_type, exc_value, exc_traceback)
             return
         self._logger.critical("Unhandled exception:", exc_info=(exc_type, exc_value, exc_traceback))
+        Logger.flush()
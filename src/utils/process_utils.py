@@ -0,0 +1,142 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.logger import Logger
+
+PROGRESS_INTERVAL = 0.1  # Seconds between progress reports, so the GUI gets at most ~10 per second
+
+
+class ProgressThrottle:
+    """Coalesce progress reports to one per PROGRESS_INTERVAL, always letting through the first and last of each stage."""
+
+    def __init__(self):
+        self.stage = None
+        self.time = 0.0
+
+    def ready(self, stage: str, done: int, total: int) -> bool:
+        now = time.monotonic()
+        final = 0 < total <= done  # A total of 0 is unknown, so those reports are throttled too
+        if stage == self.stage and not final and now - self.time < PROGRESS_INTERVAL:
+            return False
+        self.stage = stage
+        self.time = now
+        return True
+
+
+class ProcessWorker:
+    """
+    Stands in for the WorkerThread inside a pool process: cancellation is read from an event set by the
+    thread, and progress is sent back to it through a queue.
+    """
+
+    def __init__(self, events, cancel_event):
+        self.events = events
+        self.cancel_event = cancel_event
+        self.throttle = ProgressThrottle()
+        self._cancelled = False
+        self._cancel_checked = 0.0
+
+    def cancel_requested(self):
+        # The event lives in the manager process, so it is asked at most once per PROGRESS_INTERVAL
+        now = time.monotonic()
+        if not self._cancelled and now - self._cancel_checked >= PROGRESS_INTERVAL:
+            self._cancel_checked = now
+            self._cancelled = self.cancel_event.is_set()
+        return self._cancelled
+
+    def report_progress(self, stage: str, done: int, total: int, bytes_done: int = 0):
+        if self.throttle.ready(stage, done, total):
+            self.events.put((stage, done, total, bytes_done))
+
+
+def init_pool_process(process_queue, levels: dict[str, int]):
+    """Initializer of the pool processes: send log records to the parent and pay the warm-up costs once per process."""
+    Logger.configure_process(process_queue, levels)
+    from utils import audio_converter  # Only pool processes need it loaded up front
+    audio_converter.warm_up()
+
+
+def run_in_child(target_callable, kwargs, logger_name: str | None, log_level: int | None, events, cancel_event) -> int:
+    """Run a processor in a pool process, returning its return code."""
+    if logger_name and log_level is not None:
+        Logger.set_level(logger_name, log_level)
+    try:
+        result = target_callable(**kwargs, worker_instance=ProcessWorker(events, cancel_event))
+        return result if isinstance(result, int) else 0
+    except Exception:
+        Logger.get_logger(logger_name or "Worker").exception("An unexpected error occurred in worker process.")
+        return 1
+
+
+class WorkerPool:
+    """
+    Worker processes kept warm for the whole session and shared by the exporters, so a run does not have to
+    start a process, import the audio libraries and compile the resampling kernels first.
+    Nothing is started until the first call to start or submit.
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self.max_workers = max_workers
+        self._executor = None
+        self._manager = None
+        self._cancel_events = set()  # Of the runs in progress, set on shutdown
+        self._start_thread = None
+        self._log_config = None  # From Logger.process_config, released on shutdown
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start a process in the background, so it is warm by the time the first run is submitted."""
+        # Starting the manager waits for its process, so that is kept off the calling (GUI) thread too
+        self._start_thread = threading.Thread(target=lambda: self._get_executor().submit(int), name="WorkerPoolStart", daemon=True)
+        self._start_thread.start()
+
+    def submit(self, target_callable, kwargs, logger_name=None, log_level=None) -> tuple[Future, object, object]:
+        """Run target_callable(**kwargs, worker_instance=...) in a pool process. Returns its future, progress queue and cancel event."""
+        executor = self._get_executor()
+        events = self._manager.Queue()
+        cancel_event = self._manager.Event()
+        args = (target_callable, kwargs, logger_name, log_level, events, cancel_event)
+        try:
+            future = executor.submit(run_in_child, *args)
+        except BrokenProcessPool:
+            # A process of the pool died during an earlier run, start over with new ones
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            future = self._get_executor().submit(run_in_child, *args)
+        with self._lock:
+            self._cancel_events.add(cancel_event)
+        future.add_done_callback(lambda _: self._cancel_events.discard(cancel_event))
+        return future, events, cancel_event
+
+    def shutdown(self):
+        """Cancel the runs in progress and stop the processes, waiting for them to exit."""
+        if self._start_thread is not None:
+            self._start_thread.join()  # Otherwise a pool still being started would be left running
+        with self._lock:
+            executor, manager, log_config = self._executor, self._manager, self._log_config
+            self._executor = self._manager = self._log_config = None
+            for cancel_event in list(self._cancel_events):
+                cancel_event.set()
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if log_config:
+            Logger.release_process_config()  # The processes exited, so every record they logged is in the queue
+        if manager:
+            manager.shutdown()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context("spawn")  # Forking a process with a Qt event loop and threads is unsafe
+                if self._manager is None:
+                    self._manager = context.Manager()  # Its queues and events can be passed to pool processes with each run
+                if self._log_config is None:
+                    self._log_config = Logger.process_config()
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context,
+                                                     initializer=init_pool_process, initargs=self._log_config)
+            return self._executor
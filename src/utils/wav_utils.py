@@ -0,0 +1,99 @@
+import os
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+KSDATAFORMAT_SUFFIX = b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'  # GUID tail shared by all subformats
+PCM_DTYPES = {16: np.dtype('<i2'), 24: np.dtype('<i4'), 32: np.dtype('<i4')}
+
+
+class WavHeader(NamedTuple):
+    """Layout of a plain PCM WAV file, as needed to map its samples without decoding them."""
+    samplerate: int
+    channels: int
+    bits_per_sample: int
+    frames: int
+    data_offset: int
+    format: str  # 'WAV' or 'WAVEX', as libsndfile reports it
+
+    @property
+    def subtype(self) -> str:
+        return f"PCM_{self.bits_per_sample}"
+
+
+def read_wav_header(path: str) -> WavHeader | None:
+    """
+    Parse the RIFF chunks of a WAV file up to its data chunk.
+    Returns None for anything that is not 16, 24 or 32-bit integer PCM, so callers can fall back to soundfile.
+    """
+    try:
+        with open(path, 'rb') as f:
+            riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave != b'WAVE':
+                return None
+            fmt = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, chunk_size = struct.unpack('<4sI', chunk)
+                if chunk_id == b'data':
+                    break
+                if chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size)
+                    f.seek(chunk_size & 1, os.SEEK_CUR)
+                else:
+                    f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)  # Chunks are word aligned
+            data_offset = f.tell()
+            file_size = os.fstat(f.fileno()).st_size
+    except (OSError, struct.error):
+        return None
+
+    if fmt is None or len(fmt) < 16:
+        return None
+    format_tag, channels, samplerate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+    audio_format = 'WAV'
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(fmt) < 40 or fmt[26:40] != KSDATAFORMAT_SUFFIX:
+            return None
+        format_tag = struct.unpack('<H', fmt[24:26])[0]
+        audio_format = 'WAVEX'
+    if format_tag != WAVE_FORMAT_PCM or bits not in PCM_DTYPES or channels == 0 or block_align != channels * bits // 8:
+        return None
+
+    # Truncated files or streaming writers may declare more data than there is
+    data_size = min(chunk_size, file_size - data_offset)
+    frames = data_size // block_align
+    if frames == 0:
+        return None
+    return WavHeader(samplerate, channels, bits, frames, data_offset, audio_format)
+
+
+def read_pcm_data(path: str, header: WavHeader, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Return the integer samples shaped (frames, channels). 16 and 32-bit data is memory-mapped,
+    24-bit data is unpacked into the top bytes of int32 (like libsndfile does) using out if given.
+    """
+    shape = (header.frames, header.channels)
+    if header.bits_per_sample != 24:
+        return np.memmap(path, dtype=PCM_DTYPES[header.bits_per_sample], mode='r', offset=header.data_offset, shape=shape)
+
+    # Read every 3-byte sample as the int32 that ends on it, so its bytes land on top,
+    # then clear the low byte borrowed from the previous sample (or the chunk header)
+    size = header.frames * header.channels
+    packed = np.memmap(path, dtype=np.uint8, mode='r', offset=header.data_offset - 1, shape=(size * 3 + 1,))
+    overlapping = np.ndarray(shape, dtype=PCM_DTYPES[24], buffer=packed, strides=(3 * header.channels, 3))
+    return np.bitwise_and(overlapping, -256, out=out)
+
+
+def lsb(dtype: np.dtype, bits_per_sample: int) -> int:
+    """Smallest non-zero magnitude of samples read by read_pcm_data."""
+    return 1 << (np.dtype(dtype).itemsize * 8 - bits_per_sample)
+
+
+def full_scale(dtype: np.dtype) -> float:
+    """Integer value of 1.0, e.g. 32768 for int16."""
+    return float(2 ** (np.dtype(dtype).itemsize * 8 - 1))
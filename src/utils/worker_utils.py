@@ -1,12 +1,18 @@
 import logging
+import queue
+import time
 
 from PyQt6 import QtCore
 
+from utils.logger import Logger
+from utils.process_utils import ProgressThrottle, WorkerPool
+
 
 class QtSignalHandler(logging.Handler, QtCore.QObject):
     """
     A logging handler that emits log records as a PyQt signal,
     adding ANSI escape codes for colored output based on log level.
+    It is called from the logging listener thread, the signal is delivered to the GUI thread by Qt.
     """
     log_signal = QtCore.pyqtSignal(str)
 
@@ -38,16 +44,59 @@ class QtSignalHandler(logging.Handler, QtCore.QObject):
         self.log_signal.emit(f"{ansi_prefix}{formatted_message}{self.RESET_COLOR}")
 
 
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes:02}:{seconds:02}"
+
+
+def format_size(num_bytes: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
+
+
+class ProgressEstimator:
+    """Describe the progress reports of a worker, with the throughput and ETA measured since their stage started."""
+
+    def __init__(self):
+        self.stage = None
+        self.start = 0.0
+        self.start_done = 0
+        self.start_bytes = 0
+
+    def describe(self, stage: str, done: int, total: int, bytes_done: int) -> str:
+        now = time.monotonic()
+        if stage != self.stage:
+            self.stage, self.start, self.start_done, self.start_bytes = stage, now, done, bytes_done
+        text = f"{stage}: {done} / {total}" if total else f"{stage}: {done}"
+        elapsed = now - self.start
+        if elapsed < 1 or done <= self.start_done:
+            return text  # Too early for a meaningful rate
+        rate = (done - self.start_done) / elapsed
+        text += f"\n{rate:.1f} files/s"
+        if bytes_done > self.start_bytes:
+            text += f", {format_size((bytes_done - self.start_bytes) / elapsed)}/s"
+        if total > done:
+            text += f", ETA {format_duration((total - done) / rate)}"
+        return text
+
+
 class WorkerThread(QtCore.QThread):
     output_signal = QtCore.pyqtSignal(str)
     finished_signal = QtCore.pyqtSignal(int)
+    progress_signal = QtCore.pyqtSignal(str, int, int, int)  # stage, done, total, bytes
 
-    def __init__(self, target_callable, kwargs, logger_name=None):
+    def __init__(self, target_callable, kwargs, logger_name=None, pool: WorkerPool | None = None):
         super().__init__()
         self.target_callable = target_callable
         self.kwargs = kwargs
         self.logger_name = logger_name
+        self.pool = pool  # Run the target in a pool process, so it does not share the GIL with the GUI
         self._cancel_requested = False  # New cancellation flag
+        self._progress_throttle = ProgressThrottle()
 
     def request_cancel(self):
         """Sets the cancellation flag."""
@@ -57,6 +106,27 @@ class WorkerThread(QtCore.QThread):
         """Checks if cancellation has been requested."""
         return self._cancel_requested
 
+    def report_progress(self, stage: str, done: int, total: int, bytes_done: int = 0):
+        """Called by the processors as items are done, coalesced by a ProgressThrottle."""
+        if self._progress_throttle.ready(stage, done, total):
+            self.progress_signal.emit(stage, done, total, bytes_done)
+
+    def run_in_pool(self) -> int:
+        """
+        Run the target in a process of the worker pool and relay its progress and return code, while its log
+        records reach the logging listener of this process. Cancellation requests are passed on through an event.
+        """
+        log_level = logging.getLogger(self.logger_name).level if self.logger_name else None
+        future, events, cancel_event = self.pool.submit(self.target_callable, self.kwargs, self.logger_name, log_level)
+        while True:
+            if self._cancel_requested:
+                cancel_event.set()
+            try:
+                self.progress_signal.emit(*events.get(timeout=0.1))
+            except queue.Empty:
+                if future.done():  # Progress is sent before the target returns, so nothing is left behind
+                    return future.result()
+
     def run(self):
         return_code = 1  # Assume failure by default
         handler = None
@@ -64,22 +134,25 @@ class WorkerThread(QtCore.QThread):
         original_level = None
 
         if self.logger_name:
-            target_logger = logging.getLogger(self.logger_name)
+            target_logger = Logger.get_logger(self.logger_name)
             handler = QtSignalHandler()
+            handler.addFilter(logging.Filter(self.logger_name))
             handler.log_signal.connect(self.output_signal)
-            target_logger.addHandler(handler)
+            Logger.add_handler(handler)
             original_level = target_logger.level
             target_logger.setLevel(logging.INFO)  # Capture INFO and above messages
 
         try:
-            # Pass the worker instance itself to the target callable
-            # so it can check for cancellation requests.
-            self.kwargs['worker_instance'] = self
-            result = self.target_callable(**self.kwargs)
-            if isinstance(result, int):
-                return_code = result
+            if self.pool:
+                return_code = self.run_in_pool()
             else:
-                return_code = 0
+                # Pass the worker instance itself to the target callable
+                # so it can check for cancellation requests.
+                result = self.target_callable(**self.kwargs, worker_instance=self)
+                if isinstance(result, int):
+                    return_code = result
+                else:
+                    return_code = 0
         except Exception as e:
             # If an exception occurs, ensure it's logged to the GUI
             if target_logger:
@@ -89,6 +162,7 @@ class WorkerThread(QtCore.QThread):
             return_code = 1
         finally:
             if target_logger and handler:
-                target_logger.removeHandler(handler)
+                Logger.flush()  # Show every message before reporting the end
+                Logger.remove_handler(handler)
                 target_logger.setLevel(original_level)  # Restore original logger level
             self.finished_signal.emit(return_code)